@@ -0,0 +1,191 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from models import db, dialect_insert, Order, OrderItem, OrderDailyStat, CategoryDailyStat
+
+# Rollups are keyed by the UTC day the order was placed and its current
+# status. A status change moves the order's numbers from one status row to
+# another, so totals per day never need recounting.
+ORDER_STAT_COLUMNS = ('orders', 'revenue')
+CATEGORY_STAT_COLUMNS = ('orders', 'quantity', 'revenue')
+NO_CATEGORY = 0
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 365
+
+
+# ---------- Incremental updates ----------
+def _bump(model, keys, columns, rows):
+    if not rows:
+        return
+    table = model.__table__
+    stmt = dialect_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={c: table.c[c] + stmt.excluded[c] for c in columns},
+    )
+    db.session.execute(stmt, rows)
+
+
+def _category_rows(day, status, lines, sign=1):
+    # lines: {category_id: (quantity, revenue)} for a single order.
+    return [
+        {'day': day, 'category_id': cat, 'status': status,
+         'orders': sign, 'quantity': sign * qty, 'revenue': sign * revenue}
+        for cat, (qty, revenue) in lines.items()
+    ]
+
+
+def _order_lines(items):
+    lines = defaultdict(lambda: (0, 0))
+    for it in items:
+        qty, revenue = lines[it.category_id or NO_CATEGORY]
+        lines[it.category_id or NO_CATEGORY] = (qty + it.quantity, revenue + it.quantity * it.unit_price)
+    return lines
+
+
+def record_order(order):
+    # Call after the order and its items are flushed, before the commit, so
+    # the rollup rows are written in the same transaction as the order.
+    day = (order.created_at or datetime.utcnow()).date()
+    status = order.status or 'pending'
+    _bump(OrderDailyStat, ('day', 'status'), ORDER_STAT_COLUMNS,
+          [{'day': day, 'status': status, 'orders': 1, 'revenue': order.amount}])
+    _bump(CategoryDailyStat, ('day', 'category_id', 'status'), CATEGORY_STAT_COLUMNS,
+          _category_rows(day, status, _order_lines(order.items)))
+
+
+def record_status_change(orders, old_status, new_status):
+    # orders: (id, created_at, amount) rows that just moved old -> new, as
+    # returned by the UPDATE ... RETURNING in payments.apply_pending_events.
+    if not orders or old_status == new_status:
+        return
+    totals = defaultdict(lambda: [0, 0])
+    days = {}
+    for id_, created_at, amount in orders:
+        day = created_at.date()
+        days[id_] = day
+        totals[day][0] += 1
+        totals[day][1] += amount
+    order_rows = []
+    for day, (count, revenue) in totals.items():
+        order_rows.append({'day': day, 'status': old_status, 'orders': -count, 'revenue': -revenue})
+        order_rows.append({'day': day, 'status': new_status, 'orders': count, 'revenue': revenue})
+    _bump(OrderDailyStat, ('day', 'status'), ORDER_STAT_COLUMNS, order_rows)
+
+    per_category = defaultdict(lambda: [0, 0, 0])
+    lines = db.session.execute(
+        select(
+            OrderItem.order_id,
+            func.coalesce(OrderItem.category_id, NO_CATEGORY),
+            func.sum(OrderItem.quantity),
+            func.sum(OrderItem.quantity * OrderItem.unit_price),
+        )
+        .where(OrderItem.order_id.in_(list(days)))
+        .group_by(OrderItem.order_id, func.coalesce(OrderItem.category_id, NO_CATEGORY))
+    )
+    for order_id, cat, qty, revenue in lines:
+        entry = per_category[(days[order_id], cat)]
+        entry[0] += 1
+        entry[1] += qty
+        entry[2] += revenue
+    category_rows = []
+    for (day, cat), (count, qty, revenue) in per_category.items():
+        category_rows.append({'day': day, 'category_id': cat, 'status': old_status,
+                              'orders': -count, 'quantity': -qty, 'revenue': -revenue})
+        category_rows.append({'day': day, 'category_id': cat, 'status': new_status,
+                              'orders': count, 'quantity': qty, 'revenue': revenue})
+    _bump(CategoryDailyStat, ('day', 'category_id', 'status'), CATEGORY_STAT_COLUMNS, category_rows)
+
+
+# ---------- Backfill ----------
+def rebuild():
+    # Recomputes both rollups from the order history in two INSERT ... SELECTs.
+    # For backfilling existing data or repairing drift; not on the request path.
+    day = func.date(Order.created_at)
+    db.session.execute(delete(OrderDailyStat))
+    db.session.execute(delete(CategoryDailyStat))
+    db.session.execute(insert(OrderDailyStat).from_select(
+        ['day', 'status', 'orders', 'revenue'],
+        select(day, func.coalesce(Order.status, 'pending'), func.count(Order.id), func.sum(Order.amount))
+        .where(Order.created_at.is_not(None))
+        .group_by(day, func.coalesce(Order.status, 'pending')),
+    ))
+    category = func.coalesce(OrderItem.category_id, NO_CATEGORY)
+    db.session.execute(insert(CategoryDailyStat).from_select(
+        ['day', 'category_id', 'status', 'orders', 'quantity', 'revenue'],
+        select(
+            day, category, func.coalesce(Order.status, 'pending'),
+            func.count(func.distinct(Order.id)),
+            func.sum(OrderItem.quantity),
+            func.sum(OrderItem.quantity * OrderItem.unit_price),
+        )
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.created_at.is_not(None))
+        .group_by(day, category, func.coalesce(Order.status, 'pending')),
+    ))
+    db.session.commit()
+
+
+# ---------- Dashboard reads ----------
+def dashboard_summary(days=DEFAULT_DAYS):
+    # Two bounded reads over at most days x statuses (x categories) rows,
+    # however many orders exist.
+    days = max(1, min(int(days), MAX_DAYS))
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    by_status = defaultdict(lambda: {'orders': 0, 'revenue': 0})
+    daily = defaultdict(lambda: {'orders': 0, 'revenue': 0, 'paid': 0})
+    for day, status, orders, revenue in db.session.execute(
+        select(OrderDailyStat.day, OrderDailyStat.status, OrderDailyStat.orders, OrderDailyStat.revenue)
+        .where(OrderDailyStat.day >= since, OrderDailyStat.orders != 0)
+    ):
+        by_status[status]['orders'] += orders
+        by_status[status]['revenue'] += revenue
+        daily[day]['orders'] += orders
+        daily[day]['revenue'] += revenue
+        if status == 'paid':
+            daily[day]['paid'] += revenue
+
+    categories = defaultdict(lambda: {'orders': 0, 'quantity': 0, 'revenue': 0, 'paid': 0})
+    for cat, status, orders, qty, revenue in db.session.execute(
+        select(
+            CategoryDailyStat.category_id, CategoryDailyStat.status,
+            func.sum(CategoryDailyStat.orders), func.sum(CategoryDailyStat.quantity),
+            func.sum(CategoryDailyStat.revenue),
+        )
+        .where(CategoryDailyStat.day >= since)
+        .group_by(CategoryDailyStat.category_id, CategoryDailyStat.status)
+    ):
+        if not orders:
+            continue
+        entry = categories[cat]
+        entry['orders'] += orders
+        entry['quantity'] += qty
+        entry['revenue'] += revenue
+        if status == 'paid':
+            entry['paid'] += revenue
+
+    return {
+        'days': days,
+        'since': since,
+        'orders': sum(s['orders'] for s in by_status.values()),
+        'revenue': by_status.get('paid', {}).get('revenue', 0),
+        'by_status': dict(sorted(by_status.items(), key=lambda kv: -kv[1]['orders'])),
+        'daily': sorted(daily.items(), reverse=True),
+        'categories': sorted(categories.items(), key=lambda kv: (-kv[1]['paid'], -kv[1]['revenue'])),
+    }
+
+
+def main():
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        rebuild()
+        days = db.session.query(func.count(OrderDailyStat.day)).scalar()
+    print(f"✅ Order rollups rebuilt ({days} day/status rows)")
+
+
+if __name__ == '__main__':
+    main()
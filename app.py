@@ -1,38 +1,58 @@
 import os
 import uuid
-from flask import Flask, render_template, redirect, url_for, request, session, flash
+from flask import Flask, render_template, redirect, url_for, request, session, flash, abort, g
 from config import Config
-from models import db, User, Category, Product, Order
-from werkzeug.security import generate_password_hash, check_password_hash
+from models import db, User, Category, Product, Order, OrderItem
+from cache import catalog_cache
+import catalog
+import analytics
+import database
+import pagination
+import search as product_search
+import querycount
+import session_store
+import images
+import assets
+import fragments
+import httpcache
+import facets
+import payments
+import inventory
+import bulk
+import uploads
+import metrics
+import ranking
+import passwords
+from tasks import task_queue
+from querycount import query_budget
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-import stripe
-from dotenv import load_dotenv
-from werkzeug.utils import secure_filename
 
 
-# ✅ Load environment variables
-load_dotenv()  # automatically loads from Ventro/.env
-
-def create_app():
+# create_app() only wires things up: no schema changes, network calls or
+# output, so it is cheap enough to run in the gunicorn master (preload_app)
+# and fork. Tables and indexes are created by `python bootstrap.py`.
+def create_app(test_config=None):
     app = Flask(__name__, static_folder="static", template_folder="templates")
     app.config.from_object(Config)
 
-    # ✅ Load Stripe keys from environment
-    app.config['STRIPE_PUBLISHABLE_KEY'] = os.getenv('STRIPE_PUBLISHABLE_KEY')
-    app.config['STRIPE_SECRET_KEY'] = os.getenv('STRIPE_SECRET_KEY')
-
-    # ✅ Debug print to verify they loaded (optional)
-    print("Stripe Publishable Key Loaded:", bool(app.config['STRIPE_PUBLISHABLE_KEY']))
-    print("Stripe Secret Key Loaded:", bool(app.config['STRIPE_SECRET_KEY']))
-
-    db.init_app(app)
-
-    # ✅ Auto-create tables if they don't exist
-    with app.app_context():
-        db.create_all()
-
-    # ✅ Stripe setup
-    stripe.api_key = app.config['STRIPE_SECRET_KEY']
+    # Overrides for tests and benchmarks (database URL, cache paths, ...).
+    if test_config:
+        app.config.update(test_config)
+
+    database.init_app(app)
+    metrics.init_app(app)
+    catalog_cache.init_app(app)
+    catalog.init_app(app)
+    pagination.init_app(app)
+    querycount.init_app(app)
+    session_store.init_app(app)
+    images.init_app(app)
+    uploads.init_app(app)
+    assets.init_app(app)
+    fragments.init_app(app)
+    task_queue.init_app(app)
+    payments.init_app(app)
+    passwords.init_app(app)
 
     # ✅ Flask-Login setup
     login_manager = LoginManager()
@@ -45,49 +65,107 @@ def create_app():
 
     # ---------- Helper: Cart ----------
     def _get_cart():
-        return session.setdefault('cart', {})
+        # Read without setdefault() so merely viewing the cart doesn't mark
+        # the session modified (and rewrite it in the session store).
+        return session.get('cart', {})
 
     def _cart_total_and_items():
+        # Resolved once per request: one IN query for every line, memoized on
+        # `g` for as long as the cart contents don't change.
         cart = _get_cart()
+        key = tuple(sorted(cart.items()))
+        cached = g.get('cart_resolved')
+        if cached and cached[0] == key:
+            return cached[1]
+        ids = [int(pid) for pid in cart if pid.isdigit()]
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(ids)).all()} if ids else {}
         items = []
         total = 0
         for pid, qty in cart.items():
-            p = Product.query.get(int(pid))
+            p = products.get(int(pid)) if pid.isdigit() else None
             if not p:
                 continue
             subtotal = p.price * qty
             items.append({'product': p, 'qty': qty, 'subtotal': subtotal})
             total += subtotal
+        g.cart_resolved = (key, (total, items))
         return total, items
 
     # ---------- Routes ----------
     @app.route('/')
+    @query_budget(4)
     def home():
-        products = Product.query.all()
-        categories = Category.query.all()
-        print(f"✅ Home route loaded: {len(products)} products found.")
-        return render_template('home.html', products=products, categories=categories)
+        page = pagination.page_args()
+        products = catalog.get_home_page(**page)
+        categories = catalog.get_categories()
+        modified = catalog.catalog_modified()
+        # Trending only heads the first page.
+        trending = None
+        if not page['after'] and not page['before']:
+            trending = catalog.get_trending(app.config['TRENDING_LIMIT'])
+            if trending.computed_at:
+                modified = max(modified, catalog.as_datetime(trending.computed_at))
+        return httpcache.conditional(
+            lambda: render_template('home.html', products=products, categories=categories,
+                                    trending=trending.products if trending else []),
+            'home', modified, trending.computed_at if trending else '', last_modified=modified,
+        )
 
     @app.route('/search')
+    @query_budget(4)
     def search():
         query = request.args.get('q', '').strip()
-        categories = Category.query.all()
-        results = []
-        if query:
-            results = Product.query.filter(Product.title.ilike(f"%{query}%")).all()
-        return render_template('search_results.html', query=query, results=results, categories=categories)
+        categories = catalog.get_categories()
+        filters = facets.filter_args(product_search.SORTS, product_search.DEFAULT_SORT)
+        selected = catalog.get_category(request.args.get('category', ''))
+        modified = catalog.catalog_modified()
+
+        def render():
+            results, counts = [], {}
+            if query:
+                results = product_search.search_products(
+                    query, filters=filters, category_id=selected.id if selected else None, **pagination.page_args()
+                )
+                counts = product_search.search_facets(query, filters)
+            return render_template(
+                'search_results.html', query=query, results=results, categories=categories,
+                filters=filters, sorts=facets.sort_options(product_search.SORTS), selected=selected, counts=counts,
+            )
+        return httpcache.conditional(render, 'search', modified, last_modified=modified)
 
     @app.route('/category/<slug>')
+    @query_budget(4)
     def category_view(slug):
-        cat = Category.query.filter_by(slug=slug).first_or_404()
-        products = Product.query.filter_by(category=cat).all()
-        categories = Category.query.all()
-        return render_template('category.html', category=cat, products=products, categories=categories)
+        cat = catalog.get_category(slug)
+        if cat is None:
+            abort(404)
+        filters = facets.filter_args()
+        modified = catalog.catalog_modified()
+
+        def render():
+            products = catalog.get_category_page(cat.id, filters=filters, **pagination.page_args())
+            return render_template(
+                'category.html', category=cat, products=products, categories=catalog.get_categories(),
+                filters=filters, sorts=facets.sort_options(), counts=catalog.get_facets(),
+            )
+        return httpcache.conditional(render, 'category', cat.id, modified, last_modified=modified)
 
     @app.route('/product/<slug>')
+    @query_budget(4)
     def product_view(slug):
-        product = Product.query.filter_by(slug=slug).first_or_404()
-        return render_template('product.html', product=product)
+        product = catalog.get_product(slug)
+        if product is None:
+            abort(404)
+        ranking.record_view(product.id)
+        related = catalog.get_related(product.id, app.config['RELATED_LIMIT'])
+        # Versioned by the product itself, the related cards it shows and the
+        # category names, so edits elsewhere in the catalog don't invalidate it.
+        modified = max(catalog.as_datetime(p.get('updated_at') or p.created_at) for p in (product, *related))
+        return httpcache.conditional(
+            lambda: render_template('product.html', product=product, related=related),
+            'product', product.id, modified, [p.id for p in related], catalog.categories_version(),
+            last_modified=modified,
+        )
 
     @app.route('/add-to-cart/<int:product_id>', methods=['POST'])
     def add_to_cart(product_id):
@@ -99,6 +177,7 @@ def create_app():
         return redirect(request.referrer or url_for('home'))
 
     @app.route('/cart')
+    @query_budget(3)
     def cart():
         total, items = _cart_total_and_items()
         return render_template('cart.html', total=total, items=items)
@@ -122,12 +201,22 @@ def create_app():
         return redirect(url_for('cart'))
 
     @app.route('/checkout', methods=['GET', 'POST'])
+    @query_budget(9)
     def checkout():
         total, items = _cart_total_and_items()
         if not items:
             flash("Your cart is empty.", "warning")
             return redirect(url_for('home'))
         if request.method == 'POST':
+            # Stock was just read with the cart, so most sold-out lines are
+            # caught here, before any call to the payment provider. The
+            # conditional UPDATEs in inventory.reserve() have the final say.
+            tracked = {it['product'].id: it['qty'] for it in items if it['product'].stock is not None}
+            short = [it['product'].title for it in items if it['product'].id in tracked and it['product'].stock < it['qty']]
+            if short:
+                flash(f"Not enough stock left for: {', '.join(short)}", "danger")
+                return redirect(url_for('cart'))
+            ttl = app.config.get('RESERVATION_TTL', 1800)
             line_items = []
             for it in items:
                 price_in_paise = int(it['product'].price * 100)
@@ -142,16 +231,37 @@ def create_app():
                     },
                     'quantity': it['qty']
                 })
-            session_data = stripe.checkout.Session.create(
-                payment_method_types=['card'],
-                line_items=line_items,
-                mode='payment',
-                success_url=url_for('order_success', _external=True) + '?session_id={CHECKOUT_SESSION_ID}',
-                cancel_url=url_for('payment_redirect', _external=True),
-            )
+            try:
+                session_data = payments.get_gateway().create_checkout(
+                    line_items,
+                    success_url=url_for('order_success', _external=True) + '?session_id={CHECKOUT_SESSION_ID}',
+                    cancel_url=url_for('payment_redirect', _external=True),
+                    expires_at=payments.session_expires_at(ttl),
+                )
+            except payments.PaymentError:
+                flash("Payment provider is unavailable right now. Please try again.", "danger")
+                return redirect(url_for('cart'))
             order = Order(stripe_session_id=session_data.id, amount=total)
+            for it in items:
+                order.items.append(OrderItem(
+                    product_id=it['product'].id,
+                    category_id=it['product'].category_id,
+                    quantity=it['qty'],
+                    unit_price=it['product'].price,
+                ))
             db.session.add(order)
+            db.session.flush()
+            analytics.record_order(order)
+            try:
+                sold_out = inventory.reserve(order, tracked, ttl)
+            except inventory.OutOfStock as exc:
+                db.session.rollback()
+                title = next(it['product'].title for it in items if it['product'].id == exc.product_id)
+                flash(f"Sorry, {title} just sold out.", "danger")
+                return redirect(url_for('cart'))
             db.session.commit()
+            inventory.invalidate(sold_out)
+            inventory.maybe_sweep()
             return redirect(session_data.url, code=303)
         return render_template('checkout.html', total=total, items=items, stripe_pk=app.config['STRIPE_PUBLISHABLE_KEY'])
 
@@ -161,38 +271,77 @@ def create_app():
 
     @app.route('/order_success')
     def order_success():
+        # No provider round trip here: the order status is kept current by the
+        # payment webhook (see payments.py).
         session_id = request.args.get('session_id')
-        try:
-            stripe_session = stripe.checkout.Session.retrieve(session_id) if session_id else None
-        except Exception:
-            stripe_session = None
+        order = Order.query.filter_by(stripe_session_id=session_id).first() if session_id else None
         session.pop('cart', None)
-        return render_template('order_success.html', stripe_session=stripe_session)
+        return render_template('order_success.html', order=order)
 
     # ---------- Auth ----------
+    BUSY = (503, 5, "We're busy right now. Please try again in a moment.")
+
+    def _refused(template, error):
+        status, wait, message = error
+        flash(message, "danger")
+        return render_template(template), status, {'Retry-After': str(wait)}
+
     @app.route('/register', methods=['GET', 'POST'])
     def register():
         if request.method == 'POST':
             username = request.form['username']
             email = request.form['email']
             password = request.form['password']
+            keys = passwords.identity_keys(ip=request.remote_addr)
+            wait = passwords.throttle.blocked(*keys)
+            if wait:
+                return _refused('auth/register.html', (429, wait, "Too many attempts. Please try again in a few minutes."))
             if User.query.filter((User.username == username) | (User.email == email)).first():
                 flash("User already exists", "danger")
                 return redirect(url_for('register'))
-            user = User(username=username, email=email, password_hash=generate_password_hash(password))
+            # Every sign-up costs a hash, so it counts against the address too.
+            passwords.throttle.hit(*keys)
+            try:
+                password_hash = passwords.hasher.hash(password)
+            except passwords.HasherBusy:
+                return _refused('auth/register.html', BUSY)
+            user = User(username=username, email=email, password_hash=password_hash)
             db.session.add(user)
             db.session.commit()
             flash("Account created successfully! Please log in.", "success")
             return redirect(url_for('login'))
         return render_template('auth/register.html')
 
+    def _authenticate(user_query, username, password):
+        # Returns (user or None, error for _refused() or None). Throttled and
+        # busy attempts are answered before any hashing happens.
+        keys = passwords.identity_keys(username, request.remote_addr)
+        wait = passwords.throttle.blocked(*keys)
+        if wait:
+            return None, (429, wait, "Too many login attempts. Please try again in a few minutes.")
+        user = user_query.first()
+        try:
+            ok, new_hash = passwords.hasher.verify(user.password_hash, password) if user else (False, None)
+        except passwords.HasherBusy:
+            return None, BUSY
+        if not ok:
+            passwords.throttle.hit(*keys)
+            return None, None
+        if new_hash:
+            user.password_hash = new_hash
+            db.session.commit()
+        passwords.throttle.reset(*passwords.identity_keys(username))
+        return user, None
+
     @app.route('/login', methods=['GET', 'POST'])
     def login():
         if request.method == 'POST':
             username = request.form['username']
             password = request.form['password']
-            user = User.query.filter((User.username == username) | (User.email == username)).first()
-            if user and check_password_hash(user.password_hash, password):
+            user, error = _authenticate(User.query.filter((User.username == username) | (User.email == username)), username, password)
+            if error:
+                return _refused('auth/login.html', error)
+            if user:
                 login_user(user)
                 flash("Logged in successfully", "success")
                 return redirect(url_for('home'))
@@ -212,31 +361,74 @@ def create_app():
         if request.method == 'POST':
             username = request.form['username']
             password = request.form['password']
-            user = User.query.filter_by(username=username, is_admin=True).first()
-            if user and check_password_hash(user.password_hash, password):
+            user, error = _authenticate(User.query.filter_by(username=username, is_admin=True), username, password)
+            if error:
+                return _refused('admin/admin_login.html', error)
+            if user:
                 login_user(user)
                 return redirect(url_for('admin_dashboard'))
             flash("Invalid admin credentials", "danger")
         return render_template('admin/admin_login.html')
 
     @app.route('/admin/dashboard')
+    @query_budget(5)
     @login_required
     def admin_dashboard():
         if not current_user.is_admin:
             flash("Access denied", "danger")
             return redirect(url_for('home'))
-        products = Product.query.all()
-        orders = Order.query.order_by(Order.created_at.desc()).all()
-        return render_template('admin/dashboard.html', products=products, orders=orders)
+        # Totals come from the daily rollups (analytics.py); only one page of
+        # recent orders is read from the orders table itself.
+        stats = analytics.dashboard_summary(request.args.get('days', analytics.DEFAULT_DAYS, type=int))
+        categories = {c.id: c for c in catalog.get_categories()}
+        orders = pagination.keyset_page(
+            Order.query, [(Order.created_at, True), (Order.id, True)], **pagination.page_args(default=20)
+        )
+        return render_template('admin/dashboard.html', stats=stats, categories=categories, orders=orders)
 
     @app.route('/admin/products')
+    @query_budget(4)
     @login_required
     def admin_product_list():
         if not current_user.is_admin:
             flash("Access denied", "danger")
             return redirect(url_for('home'))
-        products = Product.query.all()
-        return render_template('admin/product_list.html', products=products)
+        filters = {name: request.args.get(name, '') for name in bulk.FILTER_FIELDS}
+        try:
+            criteria = bulk.selection_criteria(filters=filters, allow_all=True)
+        except bulk.BulkEditError as exc:
+            flash(str(exc), "danger")
+            criteria = []
+        matching, capped = bulk.count_matching(criteria)
+        products = pagination.keyset_page(
+            catalog.product_query().filter(*criteria), catalog.PRODUCT_ORDER, **pagination.page_args(default=50)
+        )
+        return render_template('admin/product_list.html', products=products, filters=filters,
+                               matching=matching, capped=capped, categories=catalog.get_categories())
+
+    # --- ADMIN: Bulk edit ---
+    # JSON API ({"ids": [...]} or {"filter": {...}}, "set": {...}, "dry_run")
+    # and the form on the product list; see bulk.py.
+    @app.route('/admin/products/bulk', methods=['POST'])
+    @login_required
+    def admin_bulk_edit():
+        if not current_user.is_admin:
+            if request.is_json:
+                return {'error': 'admin only'}, 403
+            flash("Access denied", "danger")
+            return redirect(url_for('home'))
+        if request.is_json:
+            try:
+                return bulk.apply(*bulk.from_json(request.get_json(silent=True)))
+            except bulk.BulkEditError as exc:
+                return {'error': str(exc)}, 400
+        try:
+            result = bulk.apply(*bulk.from_form(request.form))
+        except bulk.BulkEditError as exc:
+            flash(str(exc), "danger")
+        else:
+            flash(f"Updated {result['updated']} of {result['matched']} matching products", "success")
+        return redirect(request.referrer or url_for('admin_product_list'))
 
     @app.route('/admin/product/new', methods=['GET', 'POST'])
     @login_required
@@ -250,15 +442,28 @@ def create_app():
             price = int(request.form.get('price', 0))
             description = request.form.get('description')
             image = request.form.get('image')
+            uploaded_image = request.files.get('image_file')
+            if uploaded_image and uploaded_image.filename != '':
+                try:
+                    image = uploads.store(uploaded_image)
+                except uploads.UploadError as exc:
+                    flash(str(exc), "danger")
+                    return redirect(url_for('admin_product_form'))
             cat_slug = request.form.get('category')
             category = Category.query.filter_by(slug=cat_slug).first()
             if not category:
                 category = Category(name=cat_slug.capitalize(), slug=cat_slug)
                 db.session.add(category)
                 db.session.commit()
-            product = Product(title=title, slug=slug, price=price, description=description, image=image, category=category)
+                catalog.invalidate_categories()
+            stock = request.form.get('stock', '').strip()
+            product = Product(title=title, slug=slug, price=price, description=description, image=image, category=category,
+                              stock=int(stock) if stock.isdigit() else None)
             db.session.add(product)
+            facets.refresh([category.id])
             db.session.commit()
+            uploads.schedule_derivatives(product.image)
+            catalog.invalidate_product(slugs=[slug], category_ids=[category.id])
             flash("Product created successfully", "success")
             return redirect(url_for('admin_product_list'))
         categories = Category.query.all()
@@ -272,6 +477,19 @@ def create_app():
         categories = Category.query.all()
 
         if request.method == 'POST':
+            # The file was already streamed to a temp file while the form was
+            # parsed; storing it is a rename, and thumbnails are built later.
+            uploaded_image = request.files.get('image_file')
+            if uploaded_image and uploaded_image.filename != '':
+                try:
+                    uploaded_path = uploads.store(uploaded_image)
+                except uploads.UploadError as exc:
+                    flash(str(exc), "danger")
+                    return render_template('admin/edit_product.html', product=product, categories=categories), 400
+            else:
+                uploaded_path = None
+
+            old_slug, old_category_id = product.slug, product.category_id
             product.title = request.form['title']
             product.slug = request.form['slug']
             product.price = request.form['price']
@@ -279,15 +497,9 @@ def create_app():
             product.category_id = request.form['category_id']
 
             new_image_path = request.form.get('image', '').strip()
-            uploaded_image = request.files.get('image')
 
-            if uploaded_image and uploaded_image.filename != '':
-                filename = secure_filename(uploaded_image.filename)
-                image_folder = os.path.join('static', 'images', 'products')
-                os.makedirs(image_folder, exist_ok=True)
-                image_path = os.path.join(image_folder, filename)
-                uploaded_image.save(image_path)
-                product.image = f'images/products/{filename}'
+            if uploaded_path:
+                product.image = uploaded_path
 
             elif new_image_path:
                 new_image_path = new_image_path.replace('\\', '/').strip()
@@ -299,7 +511,19 @@ def create_app():
                 product.image = new_image_path
 
             product.is_available = 'is_available' in request.form
+            # Units on hand (open reservations already taken out); blank stops
+            # tracking. Only written when the admin changed the number shown,
+            # so sales made while the form was open aren't overwritten.
+            stock = request.form.get('stock', '').strip()
+            if stock != request.form.get('stock_shown', '').strip():
+                product.stock = int(stock) if stock.isdigit() else None
+            facets.refresh([old_category_id, product.category_id])
             db.session.commit()
+            uploads.schedule_derivatives(product.image)
+            catalog.invalidate_product(
+                slugs=[old_slug, product.slug],
+                category_ids=[old_category_id, product.category_id],
+            )
             flash('✅ Product updated successfully!', 'success')
             return redirect(url_for('admin_dashboard'))
 
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+# Output of build_assets.py, relative to the static folder.
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Fingerprinted files never change, so browsers and CDNs may keep them forever.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Content-Encoding -> file suffix, in order of preference.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def init_app(app):
+    manifest = load_manifest(app.static_folder)
+    app.extensions['asset_manifest'] = manifest
+    # Changes whenever a build changes any asset; folded into cache keys and
+    # ETags of pages that link to assets.
+    app.extensions['asset_version'] = hashlib.sha256(
+        json.dumps(manifest, sort_keys=True).encode('utf-8')
+    ).hexdigest()[:8]
+
+    # url_for('static', filename='css/style.css') -> /static/dist/css/style.<hash>.css
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == 'static' and manifest:
+            filename = values.get('filename')
+            if filename in manifest:
+                values['filename'] = manifest[filename]
+
+    prefix = DIST_DIR + '/'
+
+    def serve_static(filename):
+        if not filename.startswith(prefix):
+            return app.send_static_file(filename)
+
+        # Fingerprinted asset: prefer a precompressed sibling if the client
+        # takes it, and mark the response immutable for a year.
+        response = None
+        for encoding, suffix in ENCODINGS:
+            if request.accept_encodings.quality(encoding) <= 0:
+                continue
+            variant = safe_join(app.static_folder, filename + suffix)
+            if variant and os.path.isfile(variant):
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                response = send_from_directory(
+                    app.static_folder, filename + suffix, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE
+                )
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_from_directory(app.static_folder, filename, max_age=IMMUTABLE_MAX_AGE)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = serve_static
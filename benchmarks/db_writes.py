@@ -0,0 +1,119 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+
+import database
+from config import INSTANCE_DIR
+from models import db, Order, OrderItem, OrderDailyStat
+
+# Concurrent checkout-shaped writes (order + lines + rollup upsert in one
+# transaction) from several processes, like gunicorn workers, with readers
+# listing recent orders alongside. Run once per engine profile on a fresh
+# SQLite file and compare committed transactions per second and lock errors.
+
+
+def _engine(url, profile):
+    config = {'SQLALCHEMY_DATABASE_URI': url, 'DB_PROFILE': profile}
+    engine = create_engine(url, **database.engine_options(config))
+    if database.profile_for(config) == 'sqlite':
+        database.apply_sqlite_pragmas(engine, database.sqlite_pragmas(config))
+    return engine
+
+
+def _checkout(conn, n):
+    now = datetime.utcnow()
+    order_id = conn.execute(
+        insert(Order).values(stripe_session_id=f'cs_bench_{os.getpid()}_{n}', amount=1500, created_at=now, status='pending')
+    ).inserted_primary_key[0]
+    conn.execute(insert(OrderItem), [
+        {'order_id': order_id, 'product_id': None, 'category_id': 1, 'quantity': 1, 'unit_price': 500},
+        {'order_id': order_id, 'product_id': None, 'category_id': 2, 'quantity': 2, 'unit_price': 500},
+    ])
+    stmt = sqlite_insert(OrderDailyStat.__table__)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=['day', 'status'],
+        set_={'orders': OrderDailyStat.__table__.c.orders + 1, 'revenue': OrderDailyStat.__table__.c.revenue + 1500},
+    ).values(day=now.date(), status='pending', orders=1, revenue=1500))
+
+
+def _worker(args):
+    url, profile, role, duration = args
+    engine = _engine(url, profile)
+    done = errors = 0
+    latencies = []
+    deadline = time.perf_counter() + duration
+    n = 0
+    while time.perf_counter() < deadline:
+        n += 1
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                if role == 'writer':
+                    _checkout(conn, n)
+                else:
+                    conn.execute(select(Order.id, Order.amount).order_by(Order.id.desc()).limit(20)).all()
+                    conn.execute(select(func.count(OrderItem.id))).scalar()
+            done += 1
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            errors += 1
+    engine.dispose()
+    return role, done, errors, latencies
+
+
+def run(profile, writers, readers, duration, directory=None):
+    fd, path = tempfile.mkstemp(suffix='.db', prefix='ventro-bench-', dir=directory)
+    os.close(fd)
+    url = f'sqlite:///{path}'
+    try:
+        engine = _engine(url, profile)
+        db.metadata.create_all(engine, tables=[Order.__table__, OrderItem.__table__, OrderDailyStat.__table__])
+        engine.dispose()
+        jobs = [(url, profile, 'writer', duration)] * writers + [(url, profile, 'reader', duration)] * readers
+        with multiprocessing.Pool(len(jobs)) as pool:
+            results = pool.map(_worker, jobs)
+    finally:
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    stats = {}
+    for role in ('writer', 'reader'):
+        rows = [r for r in results if r[0] == role]
+        latencies = sorted(l for r in rows for l in r[3])
+        stats[role] = {
+            'ok': sum(r[1] for r in rows),
+            'errors': sum(r[2] for r in rows),
+            'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+        }
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent write throughput per database engine profile (SQLite).")
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds per profile")
+    parser.add_argument('--profiles', default='default,auto')
+    parser.add_argument('--dir', default=INSTANCE_DIR,
+                        help="where to create the scratch database (use the real data disk; fsync cost matters)")
+    args = parser.parse_args()
+    print(f"⏱  {args.writers} writer + {args.readers} reader processes, {args.duration:.0f}s per profile")
+    for profile in args.profiles.split(','):
+        s = run(profile, args.writers, args.readers, args.duration, args.dir)
+        w, r = s['writer'], s['reader']
+        print(f"{profile:>8}: {w['ok'] / args.duration:8,.0f} writes/s (p95 {w['p95_ms']:6.1f} ms, {w['errors']} locked)"
+              f" | {r['ok'] / args.duration:8,.0f} reads/s (p95 {r['p95_ms']:6.1f} ms, {r['errors']} locked)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from loadtest import build_app
+
+# Flash sale on one SKU: --checkouts shoppers, spread over --processes worker
+# processes (forked like gunicorn workers), all put the same product in their
+# cart and POST /checkout at once. Stock is --stock units. Checks that
+# exactly that many checkouts succeed, nothing is oversold, and that paying
+# for half the orders and sweeping the rest leaves the right count on hand.
+
+
+def shopper(app, product_id, qty, barrier, results):
+    client = app.test_client()
+    client.post(f'/add-to-cart/{product_id}', data={'qty': str(qty)})
+    barrier.wait()
+    started = time.perf_counter()
+    r = client.post('/checkout')
+    elapsed = time.perf_counter() - started
+    if r.status_code == 303:
+        results.append(('reserved', elapsed, r.headers['Location']))
+    elif r.status_code == 302 and r.headers.get('Location', '').endswith('/cart'):
+        results.append(('sold_out', elapsed, None))
+    else:
+        results.append((f'http_{r.status_code}', elapsed, None))
+
+
+def worker(app, product_id, qty, shoppers, start, out):
+    from models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+    results = []
+    barrier = threading.Barrier(shoppers + 1)
+    threads = [threading.Thread(target=shopper, args=(app, product_id, qty, barrier, results)) for _ in range(shoppers)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    # Line the processes up too, so every checkout is in flight together.
+    start.wait()
+    for t in threads:
+        t.join()
+    out.put(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel checkouts of one hot product.")
+    parser.add_argument('--checkouts', type=int, default=400)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--stock', type=int, default=150)
+    parser.add_argument('--qty', type=int, default=1, help="units per checkout")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix='ventro-inventory-') as workdir:
+        app, _, product_ids = build_app(workdir, 200, 42)
+        app.config['RESERVATION_SWEEP_INTERVAL'] = 3600
+        from models import db, Order, Product, StockReservation
+        product_id = product_ids[0]
+        with app.app_context():
+            db.session.get(Product, product_id).stock = args.stock
+            db.session.commit()
+            db.engine.dispose()
+
+        print(f"🔥 {args.checkouts} checkouts × {args.qty} unit(s) of one product with {args.stock} in stock, "
+              f"{args.processes} processes")
+        ctx = multiprocessing.get_context('fork')
+        out = ctx.Queue()
+        start = ctx.Barrier(args.processes + 1)
+        per_process = [args.checkouts // args.processes + (i < args.checkouts % args.processes) for i in range(args.processes)]
+        procs = [ctx.Process(target=worker, args=(app, product_id, args.qty, n, start, out)) for n in per_process]
+        for p in procs:
+            p.start()
+        start.wait()
+        started = time.perf_counter()
+        results = [r for _ in procs for r in out.get()]
+        wall = time.perf_counter() - started
+        for p in procs:
+            p.join()
+
+        outcomes = Counter(kind for kind, _, _ in results)
+        latencies = sorted(elapsed for _, elapsed, _ in results)
+        with app.app_context():
+            left = db.session.get(Product, product_id).stock
+            reserved = db.session.query(db.func.coalesce(db.func.sum(StockReservation.quantity), 0)).scalar()
+        expected = min(args.checkouts, args.stock // args.qty)
+        print(f"   reserved {outcomes['reserved']}, sold out {outcomes['sold_out']}, "
+              f"errors {sum(n for k, n in outcomes.items() if k.startswith('http_'))}")
+        print(f"   {len(results) / wall:.0f} checkouts/s, p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.0f} ms")
+        print(f"   stock left {left}, reserved units {reserved}")
+        ok = outcomes['reserved'] == expected and left == args.stock - expected * args.qty and reserved == expected * args.qty
+
+        # Pay for half of the orders through the stub provider, let the rest
+        # run past their reservation and sweep them.
+        import inventory
+        from tasks import task_queue
+        client = app.test_client()
+        paid = [loc for kind, _, loc in results if kind == 'reserved'][::2]
+        for location in paid:
+            client.get(location)
+        task_queue.join()
+        with app.app_context():
+            StockReservation.query.update({'expires_at': datetime.utcnow() - timedelta(days=1)})
+            db.session.commit()
+            swept = inventory.sweep()
+            left = db.session.get(Product, product_id).stock
+            statuses = dict(db.session.query(Order.status, db.func.count()).group_by(Order.status).all())
+        print(f"   paid {len(paid)}, swept {swept} → stock {left}, orders {statuses}")
+        ok = ok and left == args.stock - len(paid) * args.qty and swept == expected - len(paid)
+        print("✅ No overselling" if ok else "❌ Stock counts don't add up")
+        if not ok:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
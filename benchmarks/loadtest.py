@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+# Simulated shoppers against the storefront: each one browses home, a
+# category and a search, adds two products to the cart, updates it and checks
+# out through the stub payment gateway. Runs in-process against create_app()
+# on a scratch database seeded with a synthetic catalog. Results are written
+# as JSON so runs can be compared across commits with --compare.
+
+ADJECTIVES = ['classic', 'slim', 'wireless', 'organic', 'premium', 'compact', 'vintage', 'smart',
+              'ergonomic', 'portable', 'leather', 'cotton', 'steel', 'bamboo', 'herbal', 'digital']
+NOUNS = ['tee', 'jeans', 'watch', 'wallet', 'headset', 'speaker', 'kettle', 'honey', 'coffee',
+         'serum', 'mat', 'dumbbell', 'puzzle', 'chair', 'table', 'guitar', 'notebook', 'mount']
+CATEGORIES = ['Clothing', 'Accessories', 'Electronics', 'Home & Kitchen', 'Food & Beverages',
+              'Beauty & Personal Care', 'Fitness & Sports', 'Toys & Games', 'Furniture',
+              'Musical Instruments', 'Books & Stationery', 'Automotive']
+
+ROUTES = ('home', 'category', 'search', 'add_to_cart', 'update_cart', 'checkout', 'payment', 'order_success')
+
+
+# ---------- Catalog ----------
+def synthetic_rows(count, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        title = f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS).title()} {i}"
+        yield {
+            'title': title,
+            'slug': f'bench-{i}',
+            'description': f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} for everyday use",
+            'price': rng.randint(99, 9999),
+            'image': f'images/products/product{i % 35 + 1}.jpg',
+            'category': CATEGORIES[i % len(CATEGORIES)],
+        }
+
+
+def build_app(workdir, products, seed):
+    from app import create_app
+    from bootstrap import upgrade
+    from import_catalog import import_rows
+    from models import Category, Product
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        'CATALOG_CACHE_PATH': os.path.join(workdir, 'cache.db'),
+        'SESSION_DB_PATH': os.path.join(workdir, 'sessions.db'),
+        'FRAGMENT_CACHE_PATH': os.path.join(workdir, 'fragments.db'),
+        'LOGIN_THROTTLE_PATH': os.path.join(workdir, 'login_throttle.db'),
+        'PAYMENT_BACKEND': 'stub',
+        'SQL_QUERY_GUARD': False,
+    })
+    with app.app_context():
+        upgrade()
+        started = time.perf_counter()
+        import_rows(synthetic_rows(products, seed))
+        print(f"📦 Seeded {products:,} products in {time.perf_counter() - started:.1f}s")
+        categories = [c.slug for c in Category.query.all()]
+        product_ids = [p.id for p in Product.query.with_entities(Product.id)]
+    return app, categories, product_ids
+
+
+# ---------- Clients ----------
+class AppClient:
+    # In-process: Flask test client, cookies kept per shopper.
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        r = self.client.get(path)
+        return r.status_code, r.headers.get('Location')
+
+    def post(self, path, data):
+        r = self.client.post(path, data=data)
+        return r.status_code, r.headers.get('Location')
+
+
+def _path(location):
+    parts = urlsplit(location)
+    return parts.path + (f'?{parts.query}' if parts.query else '')
+
+
+# ---------- Shoppers ----------
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def timed(self, route, call, *args, expect=(200,)):
+        started = time.perf_counter()
+        try:
+            status, location = call(*args)
+        except Exception:
+            status, location = None, None
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.samples[route].append(elapsed)
+            if status not in expect:
+                self.errors[route] += 1
+        return location if status in expect else None
+
+
+def shop(client, rec, rng, categories, product_ids):
+    rec.timed('home', client.get, '/')
+    rec.timed('category', client.get, f'/category/{rng.choice(categories)}')
+    rec.timed('search', client.get, f'/search?q={rng.choice(NOUNS)}')
+    picks = rng.sample(product_ids, 2)
+    for pid in picks:
+        rec.timed('add_to_cart', client.post, f'/add-to-cart/{pid}', {'qty': '1'}, expect=(302,))
+    rec.timed('update_cart', client.post, '/cart/update', {f'qty_{picks[0]}': '2'}, expect=(302,))
+    location = rec.timed('checkout', client.post, '/checkout', {}, expect=(303,))
+    if location:
+        location = rec.timed('payment', client.get, _path(location), expect=(302,))
+    if location:
+        rec.timed('order_success', client.get, _path(location))
+
+
+def run(make_client, categories, product_ids, shoppers, iterations, warmup, seed):
+    rec = Recorder()
+
+    def shopper(index):
+        rng = random.Random(seed * 1000 + index)
+        client = make_client()
+        for _ in range(warmup):
+            shop(client, Recorder(), rng, categories, product_ids)
+        barrier.wait()
+        for _ in range(iterations):
+            shop(client, rec, rng, categories, product_ids)
+
+    barrier = threading.Barrier(shoppers + 1)
+    threads = [threading.Thread(target=shopper, args=(i,)) for i in range(shoppers)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    return rec, time.perf_counter() - started
+
+
+# ---------- Report ----------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(rec, wall):
+    routes = {}
+    total = 0
+    for route in ROUTES:
+        values = sorted(rec.samples.get(route, []))
+        if not values:
+            continue
+        total += len(values)
+        routes[route] = {
+            'requests': len(values),
+            'errors': rec.errors.get(route, 0),
+            'rps': len(values) / wall,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+        }
+    return routes, {'requests': total, 'errors': sum(rec.errors.values()), 'seconds': wall, 'rps': total / wall}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(routes, total):
+    print(f"{'route':<14}{'reqs':>7}{'err':>5}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, r in routes.items():
+        print(f"{route:<14}{r['requests']:>7}{r['errors']:>5}{r['rps']:>9.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}")
+    print(f"{'total':<14}{total['requests']:>7}{total['errors']:>5}{total['rps']:>9.1f}")
+
+
+def compare(result, baseline_path, tolerance):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\n📊 vs {baseline_path} (commit {baseline.get('meta', {}).get('commit')})")
+    regressions = []
+    for route, r in result['routes'].items():
+        old = baseline.get('routes', {}).get(route)
+        if not old:
+            continue
+        change = (r['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0
+        flag = '  ⚠️' if change > tolerance else ''
+        print(f"{route:<14} p95 {old['p95_ms']:8.1f} → {r['p95_ms']:8.1f} ms ({change:+.0%}){flag}")
+        if flag:
+            regressions.append(route)
+    old_rps = baseline.get('total', {}).get('rps')
+    if old_rps:
+        print(f"{'total':<14} rps {old_rps:8.1f} → {result['total']['rps']:8.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the storefront flows and report per-route latency.")
+    parser.add_argument('--products', type=int, default=5000, help="synthetic catalog size")
+    parser.add_argument('--shoppers', type=int, default=8, help="concurrent simulated shoppers")
+    parser.add_argument('--iterations', type=int, default=20, help="shopping sessions per shopper")
+    parser.add_argument('--warmup', type=int, default=1, help="unmeasured sessions per shopper")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help="write results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON from an earlier run")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="p95 slowdown vs the baseline that counts as a regression (default 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='ventro-loadtest-') as workdir:
+        app, categories, product_ids = build_app(workdir, args.products, args.seed)
+        make_client = lambda: AppClient(app)
+        print(f"🛒 {args.shoppers} shoppers × {args.iterations} sessions")
+        rec, wall = run(make_client, categories, product_ids, args.shoppers, args.iterations, args.warmup, args.seed)
+        from tasks import task_queue
+        task_queue.join()
+
+    routes, total = summarize(rec, wall)
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'date': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'products': args.products,
+            'shoppers': args.shoppers,
+            'iterations': args.iterations,
+            'seed': args.seed,
+        },
+        'routes': routes,
+        'total': total,
+    }
+    print_table(routes, total)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Results written to {args.out}")
+    if args.compare:
+        regressions = compare(result, args.compare, args.tolerance)
+        if regressions:
+            raise SystemExit(f"❌ p95 regressed on: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from loadtest import NOUNS, build_app, percentile
+
+# Catalog latency while a burst of logins is being hashed. Readers browse
+# home / category / search pages the whole time; halfway through, a storm of
+# clients starts posting valid logins as fast as they can. Runs once with
+# hashing inline on the request threads (PASSWORD_HASH_WORKERS=0, the old
+# behaviour) and once with the bounded hashing pool.
+
+PASSWORD = 'storm-password'
+
+
+def create_users(app, count):
+    import passwords
+    from models import db, User
+    with app.app_context():
+        password_hash = passwords.hasher.hash(PASSWORD)
+        db.session.add_all(User(username=f'storm{i}', email=f'storm{i}@example.com', password_hash=password_hash)
+                           for i in range(count))
+        db.session.commit()
+
+
+def reader(app, categories, stop, samples, seed):
+    rng = random.Random(seed)
+    client = app.test_client()
+    while not stop.is_set():
+        path = rng.choice(['/', f'/category/{rng.choice(categories)}', f'/search?q={rng.choice(NOUNS)}'])
+        started = time.perf_counter()
+        client.get(path)
+        samples.append((started, time.perf_counter() - started))
+
+
+def stormer(app, users, stop, statuses, seed):
+    rng = random.Random(seed)
+    client = app.test_client()
+    while not stop.is_set():
+        r = client.post('/login', data={'username': f'storm{rng.randrange(users)}', 'password': PASSWORD})
+        statuses[r.status_code] += 1
+        if r.status_code == 302:
+            client.get('/logout')
+        else:
+            # Turned away: back off briefly, as a browser user would.
+            time.sleep(0.1)
+
+
+def run(app, categories, args):
+    stop = threading.Event()
+    storm_stop = threading.Event()
+    samples = []
+    statuses = Counter()
+    readers = [threading.Thread(target=reader, args=(app, categories, stop, samples, i)) for i in range(args.readers)]
+    for t in readers:
+        t.start()
+    time.sleep(args.duration)
+    storm_started = time.perf_counter()
+    storm = [threading.Thread(target=stormer, args=(app, args.users, storm_stop, statuses, i)) for i in range(args.logins)]
+    for t in storm:
+        t.start()
+    time.sleep(args.duration)
+    storm_stop.set()
+    stop.set()
+    for t in readers + storm:
+        t.join()
+    storm_seconds = time.perf_counter() - storm_started
+    quiet = sorted(elapsed for started, elapsed in samples if started < storm_started)
+    busy = sorted(elapsed for started, elapsed in samples if started >= storm_started)
+    return quiet, busy, statuses, storm_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure catalog latency during a login storm.")
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--readers', type=int, default=4, help="concurrent catalog readers")
+    parser.add_argument('--logins', type=int, default=16, help="concurrent clients logging in during the storm")
+    parser.add_argument('--duration', type=float, default=5, help="seconds before and during the storm")
+    parser.add_argument('--workers', type=int, default=1, help="PASSWORD_HASH_WORKERS for the pooled run")
+    args = parser.parse_args()
+
+    # Slow-request and throttling warnings would drown the results.
+    logging.disable(logging.WARNING)
+    import passwords
+    with tempfile.TemporaryDirectory(prefix='ventro-logins-') as workdir:
+        app, categories, _ = build_app(workdir, args.products, 42)
+        app.config['LOGIN_THROTTLE_BACKEND'] = 'memory'
+        passwords.throttle.init_app(app)
+        create_users(app, args.users)
+        print(f"🔐 {args.readers} catalog readers, {args.logins} clients logging in, {args.duration:g}s per phase")
+        print(f"{'hashing':<10}{'quiet p50':>11}{'p95':>8}{'storm p50':>11}{'p95':>8}{'logins/s':>10}{'busy':>6}")
+        for label, workers in (('inline', 0), ('pool', args.workers)):
+            passwords.hasher.workers = workers
+            quiet, busy, statuses, storm_seconds = run(app, categories, args)
+            print(f"{label:<10}{percentile(quiet, 50) * 1000:>9.1f}ms{percentile(quiet, 95) * 1000:>6.1f}ms"
+                  f"{percentile(busy, 50) * 1000:>9.1f}ms{percentile(busy, 95) * 1000:>6.1f}ms"
+                  f"{statuses[302] / storm_seconds:>10.1f}{statuses[503]:>6}")
+
+
+if __name__ == '__main__':
+    main()
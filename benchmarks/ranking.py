@@ -0,0 +1,153 @@
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from loadtest import build_app, percentile
+
+# Trending / related products on a large catalog: seeds --products products,
+# --orders orders from the last 30 days (popularity skewed so a few products
+# sell most) and a couple of weeks of view counts. Times the ranking job
+# (first run, an unchanged re-run and a re-run after some sales and delistings)
+# and the home and product pages with the catalog and fragment caches off,
+# against running the same aggregates on the request path.
+
+
+def seed_activity(app, product_ids, orders, seed, views=True):
+    from sqlalchemy import insert
+    from models import db, Order, OrderItem, Product, ProductViewStat
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    def popular():
+        # Pareto-ish: low indexes (after a shuffle) are picked far more often.
+        return product_ids[min(len(product_ids) - 1, int(rng.paretovariate(0.8)) - 1)]
+
+    rng.shuffle(product_ids)
+    with app.app_context():
+        categories = dict(db.session.query(Product.id, Product.category_id))
+        first_id = (db.session.query(db.func.max(Order.id)).scalar() or 0) + 1
+        order_rows, item_rows = [], []
+        for n in range(orders):
+            order_id = first_id + n
+            created_at = now - timedelta(seconds=rng.randint(0, 30 * 24 * 3600))
+            order_rows.append({'id': order_id, 'amount': 0, 'created_at': created_at,
+                               'status': rng.choice(('paid', 'paid', 'paid', 'pending', 'expired'))})
+            for product_id in {popular() for _ in range(rng.randint(1, 4))}:
+                item_rows.append({'order_id': order_id, 'product_id': product_id, 'category_id': categories[product_id],
+                                  'quantity': rng.randint(1, 3), 'unit_price': 100})
+        db.session.execute(insert(Order), order_rows)
+        db.session.execute(insert(OrderItem), item_rows)
+        view_rows = {}
+        for _ in range(orders * 5 if views else 0):
+            key = ((now - timedelta(days=rng.randint(0, 13))).date(), popular())
+            view_rows[key] = view_rows.get(key, 0) + rng.randint(1, 20)
+        if view_rows:
+            db.session.execute(insert(ProductViewStat), [
+                {'day': day, 'product_id': pid, 'views': n} for (day, pid), n in view_rows.items()
+            ])
+        db.session.commit()
+    return len(item_rows), len(view_rows)
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"   {label:<34} {elapsed * 1000:8.0f} ms   {result}")
+    return result
+
+
+def page_latency(client, paths):
+    samples = []
+    for path in paths:
+        started = time.perf_counter()
+        r = client.get(path)
+        samples.append(time.perf_counter() - started)
+        if r.status_code != 200:
+            raise SystemExit(f"❌ {path} returned {r.status_code}")
+    samples.sort()
+    return percentile(samples, 50) * 1000, percentile(samples, 95) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ranking job and ranked page reads on a large catalog.")
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=200, help="page requests per route")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix='ventro-ranking-') as workdir:
+        app, _, product_ids = build_app(workdir, args.products, args.seed)
+        started = time.perf_counter()
+        items, views = seed_activity(app, list(product_ids), args.orders, args.seed)
+        print(f"🛒 Seeded {args.orders:,} orders ({items:,} lines) and {views:,} daily view counts "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        import ranking
+        from cache import NullBackend, catalog_cache
+        from models import db, Order, OrderItem, Product, RelatedProduct
+        from sqlalchemy import func, select, update
+        from sqlalchemy.orm import aliased
+        catalog_cache.backend = NullBackend()
+        app.jinja_env.fragment_cache = NullBackend()
+
+        print("⏱  Ranking job")
+        with app.app_context():
+            timed("first run", ranking.rebuild)
+            timed("re-run, nothing changed", ranking.rebuild)
+            rng = random.Random(args.seed)
+            delisted = rng.sample(product_ids, 100)
+            db.session.execute(update(Product).where(Product.id.in_(delisted)).values(is_available=False))
+            db.session.commit()
+            seed_activity(app, list(product_ids), args.orders // 100, args.seed + 1, views=False)
+            timed("re-run, 100 delisted + 1% orders", ranking.rebuild)
+            related_rows = db.session.query(func.count()).select_from(RelatedProduct).scalar()
+        print(f"   related_product: {related_rows:,} rows")
+
+        client = app.test_client()
+        rng = random.Random(args.seed)
+        with app.app_context():
+            slugs = dict(db.session.query(Product.id, Product.slug))
+        sample = [slugs[rng.choice(product_ids)] for _ in range(args.requests)]
+
+        print("⏱  Pages, caches off (p50 / p95)")
+        home = page_latency(client, ['/'] * args.requests)
+        product = page_latency(client, [f'/product/{s}' for s in sample])
+        print(f"   {'home (trending + newest)':<34} {home[0]:6.1f} / {home[1]:6.1f} ms")
+        print(f"   {'product (with related)':<34} {product[0]:6.1f} / {product[1]:6.1f} ms")
+
+        # What the same lists would cost if the pages computed them.
+        print("⏱  Same aggregates on the request path")
+        config = app.config
+        with app.app_context():
+            timed("trending scores", lambda: len(ranking.trending_scores(
+                datetime.utcnow(), config['TRENDING_DAYS'], config['TRENDING_HALF_LIFE_DAYS'],
+                config['TRENDING_VIEW_WEIGHT'])))
+            mine, other = aliased(OrderItem), aliased(OrderItem)
+            top = db.session.scalars(
+                select(OrderItem.product_id).group_by(OrderItem.product_id).order_by(func.count().desc()).limit(1)
+            ).first()
+            since = datetime.utcnow() - timedelta(days=config['RELATED_ORDER_DAYS'])
+            timed("bought-together, best seller", lambda: len(db.session.execute(
+                select(other.product_id, func.count())
+                .select_from(mine)
+                .join(other, (other.order_id == mine.order_id) & (other.product_id != mine.product_id))
+                .join(Order, Order.id == mine.order_id)
+                .where(mine.product_id == top, Order.created_at >= since)
+                .group_by(other.product_id)
+            ).all()))
+        print("✅ Done")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+# Worker start-up cost, the two ways gunicorn can start a worker:
+#   cold    - a fresh interpreter imports the app, runs create_app() and
+#             serves its first request (no preload_app, or a full restart)
+#   fork    - a worker forked from a master that already ran create_app()
+#             (preload_app = True in gunicorn.conf.py), up to its first request
+# Both run against a scratch copy of the database.
+
+COLD = """
+import time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+app.test_client().get('/')
+served = time.perf_counter()
+print(imported - started, created - imported, served - created)
+"""
+
+
+def cold_start(env):
+    started = time.perf_counter()
+    out = subprocess.check_output([sys.executable, '-c', COLD], cwd=BASE_DIR, env=env, text=True)
+    wall = time.perf_counter() - started
+    imported, created, served = map(float, out.split()[-3:])
+    return wall, imported, created, served
+
+
+def fork_start(app):
+    from models import db
+    started = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        with app.app_context():
+            db.engine.dispose(close=False)
+        app.test_client().get('/')
+        os._exit(0)
+    os.waitpid(pid, 0)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start vs preloaded fork start of a worker.")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='ventro-startup-')
+    try:
+        db_path = os.path.join(workdir, 'ventro.db')
+        shutil.copy(os.path.join(BASE_DIR, 'instance', 'ventro.db'), db_path)
+        env = dict(os.environ,
+                   DATABASE_URL=f'sqlite:///{db_path}',
+                   CATALOG_CACHE_PATH=os.path.join(workdir, 'cache.db'),
+                   SESSION_DB_PATH=os.path.join(workdir, 'sessions.db'),
+                   FRAGMENT_CACHE_PATH=os.path.join(workdir, 'fragments.db'),
+                   LOGIN_THROTTLE_PATH=os.path.join(workdir, 'login_throttle.db'))
+        subprocess.check_call([sys.executable, 'bootstrap.py'], cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL)
+
+        cold = [cold_start(env) for _ in range(args.runs)]
+        print(f"🧊 cold start:  {statistics.median(c[0] for c in cold) * 1000:7.0f} ms median wall "
+              f"(imports {statistics.median(c[1] for c in cold) * 1000:.0f} ms, "
+              f"create_app {statistics.median(c[2] for c in cold) * 1000:.0f} ms, "
+              f"first request {statistics.median(c[3] for c in cold) * 1000:.0f} ms)")
+
+        os.environ.update(env)
+        from app import create_app
+        app = create_app()
+        forked = [fork_start(app) for _ in range(args.runs)]
+        print(f"🍴 fork start:  {statistics.median(forked) * 1000:7.0f} ms median to first response")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import time
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+import analytics
+import facets
+import ranking
+import search
+from models import db
+
+# Schema setup that used to run inside create_app() on every worker boot.
+# Run it once per deploy (Procfile "release" step) or after pulling new code:
+#
+#   python bootstrap.py
+#
+# It is additive and safe to repeat: missing tables are created, columns and
+# indexes added to models since a table was created are added in place, and
+# the search index is built if it is missing.
+
+# Derived tables filled from existing data when bootstrap first creates them.
+BACKFILLS = {
+    'order_daily_stat': analytics.rebuild,
+    'category_facet': facets.refresh,
+    'trending_product': ranking.rebuild,
+}
+
+
+def add_missing_columns(conn, table, existing):
+    added = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        # SQLite can only ADD COLUMN without constraints beyond a default, so
+        # new columns must be nullable or carry a server_default.
+        ddl = CreateColumn(column).compile(dialect=conn.dialect)
+        conn.execute(text(f'ALTER TABLE {conn.dialect.identifier_preparer.quote(table.name)} ADD COLUMN {ddl}'))
+        added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def add_missing_indexes(conn, table, existing):
+    added = []
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(conn)
+            added.append(index.name)
+    return added
+
+
+def upgrade():
+    changes = {'tables': [], 'columns': [], 'indexes': []}
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                table.create(conn)
+                changes['tables'].append(table.name)
+                continue
+            columns = {c['name'] for c in inspector.get_columns(table.name)}
+            changes['columns'] += add_missing_columns(conn, table, columns)
+            indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            changes['indexes'] += add_missing_indexes(conn, table, indexes)
+    search.ensure_index()
+    for name in changes['tables']:
+        if name in BACKFILLS:
+            BACKFILLS[name]()
+            db.session.commit()
+    return changes
+
+
+def main(app=None):
+    if app is None:
+        from app import create_app
+        app = create_app()
+    started = time.perf_counter()
+    with app.app_context():
+        changes = upgrade()
+    for kind, label in (('tables', 'table'), ('columns', 'column'), ('indexes', 'index')):
+        for name in changes[kind]:
+            print(f"➕ Added {label} {name}")
+    print(f"✅ Database is up to date ({time.perf_counter() - started:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
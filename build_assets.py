@@ -0,0 +1,158 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from assets import DIST_DIR, MANIFEST_NAME
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are written without it
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+
+# Workers still running the previous release, and pages a CDN cached from
+# it, keep linking to the previous hashed files until they are replaced. So a
+# build never deletes files the last KEEP_BUILDS manifests point at; they are
+# listed, newest last, in static/dist/builds.json.
+KEEP_BUILDS = 3
+HISTORY_NAME = 'builds.json'
+
+# Files that are still being written by an upload or a download.
+IN_FLIGHT = ('.tmp', '.part')
+
+# Text formats worth precompressing; images are already compressed.
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.html')
+MIN_COMPRESS_SIZE = 512
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()[:12]
+
+
+def iter_sources(static_dir):
+    # Dot-directories (uploads/.incoming holds uploads still being written)
+    # and dot-files are skipped, and so are half-written .part / .tmp files.
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        rel_root = os.path.relpath(root, static_dir).replace(os.sep, '/')
+        if rel_root == DIST_DIR or rel_root.startswith(DIST_DIR + '/'):
+            dirs[:] = []
+            continue
+        for name in files:
+            if name.startswith('.') or name.endswith(IN_FLIGHT):
+                continue
+            yield name if rel_root == '.' else f'{rel_root}/{name}'
+
+
+def write_compressed(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    written = []
+    # mtime=0 keeps the .gz byte-identical between builds.
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        with open(path + '.gz', 'wb') as f:
+            f.write(gz)
+        written.append('gz')
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            with open(path + '.br', 'wb') as f:
+                f.write(br)
+            written.append('br')
+    return written
+
+
+def _read_json(path, default):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _write_json(path, data):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def prune(dist_dir, keep_files):
+    # Removes hashed files (and their .gz/.br) that no kept build refers to.
+    removed = 0
+    keep = {os.path.join(dist_dir, *rel[len(DIST_DIR) + 1:].split('/')) for rel in keep_files}
+    keep |= {os.path.join(dist_dir, MANIFEST_NAME), os.path.join(dist_dir, HISTORY_NAME)}
+    for root, dirs, files in os.walk(dist_dir, topdown=False):
+        for name in files:
+            path = os.path.join(root, name)
+            base = path[:-3] if name.endswith(('.gz', '.br')) else path
+            if base not in keep and path not in keep:
+                os.remove(path)
+                removed += 1
+        if root != dist_dir and not os.listdir(root):
+            os.rmdir(root)
+    return removed
+
+
+def build(static_dir=STATIC_DIR, keep=KEEP_BUILDS):
+    # keep: how many builds' files to leave in place, this one included;
+    # 0 never deletes anything.
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    manifest_path = os.path.join(dist_dir, MANIFEST_NAME)
+    history_path = os.path.join(dist_dir, HISTORY_NAME)
+    history = _read_json(history_path, None)
+    if history is None:
+        # First build with a history: the live manifest is the previous build.
+        previous = _read_json(manifest_path, {})
+        history = [sorted(previous.values())] if previous else []
+    manifest = {}
+    compressed = 0
+    for rel in sorted(iter_sources(static_dir)):
+        source = os.path.join(static_dir, *rel.split('/'))
+        stem, ext = os.path.splitext(rel)
+        hashed = f'{DIST_DIR}/{stem}.{file_hash(source)}{ext}'
+        target = os.path.join(static_dir, *hashed.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy2(source, target)
+        if ext.lower() in COMPRESSIBLE and os.path.getsize(source) >= MIN_COMPRESS_SIZE:
+            if write_compressed(target):
+                compressed += 1
+        manifest[rel] = hashed
+
+    # Written last so a running app never loads a manifest pointing at files
+    # that don't exist yet.
+    os.makedirs(dist_dir, exist_ok=True)
+    _write_json(manifest_path, manifest)
+    history = (history + [sorted(manifest.values())])[-max(keep, 1):]
+    _write_json(history_path, history)
+    removed = prune(dist_dir, {rel for build in history for rel in build}) if keep else 0
+    return manifest, compressed, removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint static assets and write precompressed variants.")
+    parser.add_argument('--keep', type=int, default=KEEP_BUILDS,
+                        help=f"builds whose files stay in static/dist, this one included (default {KEEP_BUILDS}; "
+                             "0 never deletes)")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    manifest, compressed, removed = build(keep=args.keep)
+    print(f"✅ {len(manifest)} assets fingerprinted, {compressed} precompressed"
+          f"{'' if brotli else ' (gzip only: install Brotli for .br)'}")
+    if removed:
+        print(f"🧹 Removed {removed} files from builds older than the last {args.keep}")
+    print(f"🎉 Manifest written in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
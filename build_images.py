@@ -0,0 +1,46 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import images
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+SOURCE_DIR = os.path.join(STATIC_DIR, 'images', 'products')
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+
+def _build(args):
+    image, force = args
+    return image, images.generate_derivatives(STATIC_DIR, image, force=force)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build thumbnail/medium WebP + JPEG derivatives for product images.")
+    parser.add_argument('--force', action='store_true', help="rebuild even if derivatives are up to date")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="parallel image workers")
+    args = parser.parse_args()
+
+    if images.Image is None:
+        raise SystemExit("❌ Pillow is not installed (pip install -r requirements.txt)")
+
+    sources = sorted(
+        os.path.relpath(path, STATIC_DIR).replace(os.sep, '/')
+        for pattern in ('*', 'uploads/*')  # admin uploads live in uploads/
+        for path in glob.glob(os.path.join(SOURCE_DIR, pattern))
+        if path.lower().endswith(EXTENSIONS)
+    )
+    started = time.perf_counter()
+    built = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for image, created in pool.map(_build, [(s, args.force) for s in sources]):
+            if created:
+                built += 1
+                print(f"✅ {image}: {len(created)} derivatives")
+    print(f"🎉 {built}/{len(sources)} images processed in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+from datetime import datetime
+
+from sqlalchemy import Integer, case, cast, false, func, select, update
+
+import facets
+import search
+from cache import catalog_cache
+from models import db, Category, Product
+
+# Bulk product edits for the admin: pick products by id list or by filter,
+# change price / availability / category for all of them with one UPDATE,
+# then refresh the facet counts and drop the catalog cache once.
+#
+#   {"filter": {"category": "clothing", "max_price": 999},
+#    "set": {"price_percent": -10, "is_available": true},
+#    "dry_run": false}
+
+MAX_IDS = 10000
+COUNT_LIMIT = 10000
+FILTER_FIELDS = ('category', 'min_price', 'max_price', 'available', 'q')
+PRICE_FIELDS = ('price', 'price_percent', 'price_delta')
+
+
+class BulkEditError(ValueError):
+    pass
+
+
+# ---------- Parsing ----------
+def _int(value, name, minimum=None):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise BulkEditError(f"{name} must be a whole number")
+    if minimum is not None and number < minimum:
+        raise BulkEditError(f"{name} must be at least {minimum}")
+    return number
+
+
+def _bool(value, name):
+    if isinstance(value, bool):
+        return value
+    if value in ('1', 'true', 'yes', 1):
+        return True
+    if value in ('0', 'false', 'no', 0):
+        return False
+    raise BulkEditError(f"{name} must be true or false")
+
+
+def _str(value, name):
+    if not isinstance(value, str):
+        raise BulkEditError(f"{name} must be a string")
+    return value
+
+
+def _dict(value, name):
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise BulkEditError(f"{name} must be an object")
+    return value
+
+
+def _ids(value):
+    # A string would be iterated one character at a time, so only a real list
+    # of whole numbers is accepted.
+    if not isinstance(value, list) or any(isinstance(i, bool) or not isinstance(i, int) for i in value):
+        raise BulkEditError("ids must be a list of whole numbers")
+    return value
+
+
+def _category_id(slug):
+    _str(slug, 'category')
+    category = Category.query.filter_by(slug=slug).first()
+    if category is None:
+        raise BulkEditError(f"Unknown category: {slug}")
+    return category.id
+
+
+def selection_criteria(ids=None, filters=None, allow_all=False):
+    # WHERE clauses for the products to edit. An empty filter would select
+    # the whole catalog, so that needs {"all": true}.
+    if ids is not None:
+        ids = sorted(set(_ids(ids)))
+        if not ids:
+            raise BulkEditError("No products selected")
+        if len(ids) > MAX_IDS:
+            raise BulkEditError(f"At most {MAX_IDS} ids per request; use a filter for more")
+        return [Product.id.in_(ids)]
+    filters = _dict(filters, 'filter')
+    criteria = []
+    if filters.get('category'):
+        criteria.append(Product.category_id == _category_id(filters['category']))
+    if filters.get('min_price') not in (None, ''):
+        criteria.append(Product.price >= _int(filters['min_price'], 'min_price', 0))
+    if filters.get('max_price') not in (None, ''):
+        criteria.append(Product.price <= _int(filters['max_price'], 'max_price', 0))
+    if filters.get('available') not in (None, ''):
+        criteria.append(Product.is_available.is_(_bool(filters['available'], 'available')))
+    if filters.get('q'):
+        criteria.append(_title_matches(_str(filters['q'], 'q')))
+    if not criteria and not allow_all and not _bool(filters.get('all') or False, 'all'):
+        raise BulkEditError('Refusing to edit every product; pass a filter, ids, or "all": true')
+    return criteria
+
+
+def _title_matches(q):
+    # On SQLite the title words come from the FTS index (word prefixes, like
+    # the storefront search) instead of scanning every title with LIKE.
+    if not search.uses_fts():
+        return Product.title.ilike(f"%{q.strip()}%")
+    terms = search.search_terms(q)
+    if not terms:
+        return false()
+    hits = search._fts_hits(terms, column='title')
+    return Product.id.in_(select(hits.c.id))
+
+
+def count_matching(criteria, limit=COUNT_LIMIT):
+    # For the admin list: counts at most `limit` + 1 rows, so a broad filter
+    # costs a bounded index walk rather than a COUNT over the whole catalog.
+    # Returns (count, capped).
+    matched = select(Product.id).where(*criteria).limit(limit + 1).subquery()
+    count = db.session.scalar(select(func.count()).select_from(matched))
+    return min(count, limit), count > limit
+
+
+def change_values(changes):
+    changes = _dict(changes, 'set')
+    values = {}
+    prices = [f for f in PRICE_FIELDS if changes.get(f) not in (None, '')]
+    if len(prices) > 1:
+        raise BulkEditError("Give only one of price, price_percent and price_delta")
+    if 'price' in prices:
+        values['price'] = _int(changes['price'], 'price', 0)
+    elif 'price_percent' in prices:
+        percent = _int(changes['price_percent'], 'price_percent', -99)
+        values['price'] = cast(func.round(Product.price * (100 + percent) / 100.0), Integer)
+    elif 'price_delta' in prices:
+        delta = _int(changes['price_delta'], 'price_delta')
+        values['price'] = case((Product.price + delta < 0, 0), else_=Product.price + delta)
+    if changes.get('is_available') not in (None, ''):
+        values['is_available'] = _bool(changes['is_available'], 'is_available')
+    if changes.get('category'):
+        values['category_id'] = _category_id(changes['category'])
+    if not values:
+        raise BulkEditError("Nothing to change")
+    values['updated_at'] = datetime.utcnow()
+    return values
+
+
+def from_form(form):
+    # The admin product list posts flat fields; returns apply()'s arguments.
+    filters = {name: form.get(name) for name in FILTER_FIELDS if form.get(name)}
+    ids = [_int(i, 'ids') for i in form.getlist('ids')] if form.get('scope') == 'selected' else None
+    changes = {}
+    if form.get('set_price'):
+        field = {'set': 'price', 'percent': 'price_percent', 'delta': 'price_delta'}.get(form.get('set_price_mode'), 'price')
+        changes[field] = form['set_price']
+    if form.get('set_available') in ('0', '1'):
+        changes['is_available'] = form['set_available']
+    if form.get('set_category'):
+        changes['category'] = form['set_category']
+    return ids, filters, changes
+
+
+def from_json(body):
+    # {"ids" | "filter", "set", "dry_run"}; returns apply()'s arguments.
+    body = _dict(body, 'body')
+    ids = body.get('ids')
+    return (
+        None if ids is None else _ids(ids),
+        _dict(body.get('filter'), 'filter'),
+        _dict(body.get('set'), 'set'),
+        _bool(body.get('dry_run') or False, 'dry_run'),
+    )
+
+
+# ---------- Applying ----------
+def apply(ids=None, filters=None, changes=None, dry_run=False):
+    # One transaction: count what matches per category, one UPDATE, one
+    # facet refresh for the categories involved, commit, one cache clear.
+    criteria = selection_criteria(ids, filters)
+    values = change_values(changes)
+    dry_run = _bool(dry_run or False, 'dry_run')
+    by_category = dict(db.session.execute(
+        select(Product.category_id, func.count()).where(*criteria).group_by(Product.category_id)
+    ).all())
+    result = {
+        'matched': sum(by_category.values()),
+        'updated': 0,
+        'by_category': {str(c or ''): n for c, n in by_category.items()},
+        'dry_run': dry_run,
+    }
+    if dry_run or not result['matched']:
+        db.session.rollback()
+        return result
+    result['updated'] = db.session.execute(
+        update(Product).where(*criteria).values(**values).execution_options(synchronize_session=False)
+    ).rowcount
+    facets.refresh(set(by_category) | {values.get('category_id')})
+    db.session.commit()
+    catalog_cache.clear()
+    return result
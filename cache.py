@@ -0,0 +1,259 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+
+# ---------- Serialization ----------
+class Snapshot(dict):
+    # Plain-data stand-in for ORM rows: templates can keep using `p.title`,
+    # `p.category.name`, ... and the value survives a round trip through a
+    # shared backend.
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+def dumps(value):
+    return json.dumps(value, default=_json_default, separators=(',', ':'))
+
+
+def loads(raw):
+    return json.loads(raw, object_hook=Snapshot)
+
+
+# ---------- Backends ----------
+class MemoryBackend:
+    # Per-process LRU with TTL. Fastest option, but each gunicorn worker
+    # holds its own copy, so invalidation only reaches the worker that made
+    # the write (other workers catch up when the TTL runs out).
+    shared = False
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, raw = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return raw
+
+    def set(self, key, raw, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, raw)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteBackend:
+    # Shared by every worker on the host through a small SQLite file, so an
+    # admin write in one worker is visible to all of them immediately.
+    shared = True
+    TOUCH_INTERVAL = 30  # seconds between LRU timestamp refreshes per key
+
+    def __init__(self, path, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entry ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed ON cache_entry (accessed_at)")
+
+    def _conn(self):
+        # sqlite3 connections must not cross threads (or forked workers).
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM cache_entry WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        raw, expires_at, accessed_at = row
+        now = time.time()
+        if expires_at < now:
+            conn.execute("DELETE FROM cache_entry WHERE key = ? AND expires_at < ?", (key, now))
+            return None
+        # Refreshing the LRU timestamp is a write, so only do it occasionally.
+        if now - accessed_at > self.TOUCH_INTERVAL:
+            conn.execute("UPDATE cache_entry SET accessed_at = ? WHERE key = ?", (now, key))
+        return raw
+
+    def set(self, key, raw, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT INTO cache_entry (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET value = excluded.value,"
+            " expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+            (key, raw, now + ttl, now),
+        )
+        count = conn.execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute("DELETE FROM cache_entry WHERE expires_at < ?", (now,))
+            conn.execute(
+                "DELETE FROM cache_entry WHERE key IN ("
+                " SELECT key FROM cache_entry ORDER BY accessed_at LIMIT"
+                " MAX(0, (SELECT COUNT(*) FROM cache_entry) - ?))",
+                (self.max_entries,),
+            )
+
+    def delete(self, *keys):
+        if keys:
+            self._conn().executemany("DELETE FROM cache_entry WHERE key = ?", [(k,) for k in keys])
+
+    def delete_prefix(self, prefix):
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        self._conn().execute("DELETE FROM cache_entry WHERE key LIKE ? ESCAPE '\\'", (escaped + '%',))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache_entry")
+
+
+class RedisBackend:
+    # Shared across hosts. Eviction is left to Redis (maxmemory-policy allkeys-lru).
+    shared = True
+
+    def __init__(self, url, namespace='ventro:catalog:'):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def get(self, key):
+        raw = self.client.get(self.namespace + key)
+        return raw.decode('utf-8') if raw is not None else None
+
+    def set(self, key, raw, ttl):
+        self.client.setex(self.namespace + key, int(ttl), raw)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.namespace + k for k in keys])
+
+    def delete_prefix(self, prefix):
+        batch = list(self.client.scan_iter(match=self.namespace + prefix + '*', count=500))
+        if batch:
+            self.client.delete(*batch)
+
+    def clear(self):
+        self.delete_prefix('')
+
+
+class NullBackend:
+    shared = True
+
+    def get(self, key):
+        return None
+
+    def set(self, key, raw, ttl):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+    def clear(self):
+        pass
+
+
+def make_backend(app, prefix, namespace='ventro:catalog:'):
+    # `prefix` selects a config namespace, e.g. CATALOG_CACHE_BACKEND;
+    # `namespace` keeps caches sharing one Redis apart.
+    kind = app.config.get(f'{prefix}_BACKEND', 'memory')
+    max_entries = app.config.get(f'{prefix}_MAX_ENTRIES', 1024)
+    if kind == 'memory':
+        return MemoryBackend(max_entries=max_entries)
+    if kind == 'sqlite':
+        return SQLiteBackend(app.config[f'{prefix}_PATH'], max_entries=max_entries)
+    if kind == 'redis':
+        return RedisBackend(app.config[f'{prefix}_URL'], namespace=namespace)
+    if kind == 'null':
+        return NullBackend()
+    raise ValueError(f"Unknown {prefix}_BACKEND: {kind!r}")
+
+
+# ---------- Catalog cache ----------
+class CatalogCache:
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.default_ttl = 300
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backend = make_backend(app, 'CATALOG_CACHE')
+        self.default_ttl = app.config.get('CATALOG_CACHE_TTL', 300)
+        app.extensions['catalog_cache'] = self
+
+    def get_or_set(self, key, loader, ttl=None):
+        raw = self.backend.get(key)
+        if raw is not None:
+            return loads(raw)
+        value = loader()
+        # Misses (e.g. unknown slugs) are not cached so bad URLs can't flood the LRU.
+        if value is None:
+            return None
+        raw = dumps(value)
+        self.backend.set(key, raw, ttl or self.default_ttl)
+        return loads(raw)
+
+    def invalidate(self, *keys):
+        self.backend.delete(*keys)
+
+    def invalidate_prefix(self, *prefixes):
+        for prefix in prefixes:
+            self.backend.delete_prefix(prefix)
+
+    def clear(self):
+        self.backend.clear()
+
+
+catalog_cache = CatalogCache()
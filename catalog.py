@@ -0,0 +1,175 @@
+import hashlib
+from datetime import datetime
+
+from flask import current_app, g
+from sqlalchemy.orm import joinedload
+
+from cache import catalog_cache, dumps
+from facets import SORTS, apply_filters, filter_key, in_stock
+from models import Category, CategoryFacet, Product, RelatedProduct, TrendingProduct
+from pagination import Page, keyset_page
+
+# Newest first; id breaks ties between rows created in the same instant.
+PRODUCT_ORDER = SORTS['newest']
+FACETS_KEY = 'facets'
+
+# Time of the last catalog write, kept in the catalog cache. Dropping the key
+# is the "bump": the next read stores the current time. It keeps microseconds
+# so two bumps within a second still give different ETags (Last-Modified is
+# truncated to the second by werkzeug). A shared backend keeps it until the
+# next write; a per-process one only hears about this worker's writes, so
+# there it expires with the rest of the cache (CATALOG_CACHE_TTL) and other
+# workers' ETags catch up as their cached pages do.
+VERSION_KEY = 'catalog-version'
+VERSION_TTL = 30 * 24 * 3600
+
+
+# ---------- Snapshots ----------
+# Cached catalog data is stored as plain dicts (see cache.Snapshot) so that it
+# can live in a shared backend and be rendered without touching the session.
+def category_snapshot(c):
+    return {'id': c.id, 'name': c.name, 'slug': c.slug}
+
+
+def product_snapshot(p):
+    return {
+        'id': p.id,
+        'title': p.title,
+        'slug': p.slug,
+        'description': p.description,
+        'price': p.price,
+        'image': p.image,
+        # Whether it can be bought: listed and not sold out.
+        'is_available': p.in_stock,
+        'category_id': p.category_id,
+        'category': category_snapshot(p.category) if p.category else None,
+        'created_at': p.created_at,
+        'updated_at': p.updated_at,
+    }
+
+
+# ---------- Reads ----------
+def product_query():
+    # Every catalog listing renders the category name, so load it in the same
+    # SELECT instead of one lazy load per product card.
+    return Product.query.options(joinedload(Product.category))
+
+
+def get_categories():
+    return catalog_cache.get_or_set(
+        'categories',
+        lambda: [category_snapshot(c) for c in Category.query.all()],
+    )
+
+
+def categories_version():
+    # Short digest of the category list, for fragment cache keys (see
+    # fragments.py): it changes whenever a category is added or renamed.
+    if 'categories_version' not in g:
+        g.categories_version = hashlib.sha1(dumps(get_categories()).encode('utf-8')).hexdigest()[:10]
+    return g.categories_version
+
+
+def as_datetime(value):
+    # Snapshot timestamps come back from the cache as ISO strings.
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def catalog_modified():
+    if 'catalog_modified' not in g:
+        ttl = VERSION_TTL if catalog_cache.backend.shared else None
+        snapshot = catalog_cache.get_or_set(VERSION_KEY, lambda: {'at': datetime.utcnow()}, ttl=ttl)
+        g.catalog_modified = as_datetime(snapshot.at)
+    return g.catalog_modified
+
+
+def get_category(slug):
+    for c in get_categories():
+        if c.slug == slug:
+            return c
+    return None
+
+
+def _cached_page(key, query, per_page, after, before, order=PRODUCT_ORDER):
+    def load():
+        page = keyset_page(query, order, per_page, after=after, before=before)
+        return page.to_dict(product_snapshot)
+    return Page.from_dict(catalog_cache.get_or_set(f"{key}:{per_page}:{after or ''}:{before or ''}", load))
+
+
+def get_home_page(per_page, after=None, before=None):
+    return _cached_page('home', product_query(), per_page, after, before)
+
+
+def get_category_page(category_id, per_page, after=None, before=None, filters=None):
+    query = product_query().filter(Product.category_id == category_id)
+    if filters is None:
+        return _cached_page(f'category:{category_id}', query, per_page, after, before)
+    # Each filter combination is its own cache entry under the category's
+    # prefix, so invalidate_product() still drops all of them.
+    return _cached_page(
+        f'category:{category_id}:{filter_key(filters)}', apply_filters(query, filters),
+        per_page, after, before, order=SORTS[filters['sort']],
+    )
+
+
+def get_facets():
+    # {category_id: Snapshot(products, available, min_price, max_price)}
+    rows = catalog_cache.get_or_set(FACETS_KEY, lambda: [
+        {'category_id': f.category_id, 'products': f.products, 'available': f.available,
+         'min_price': f.min_price, 'max_price': f.max_price}
+        for f in CategoryFacet.query.all()
+    ])
+    return {f.category_id: f for f in rows}
+
+
+def get_product(slug):
+    def load():
+        p = product_query().filter(Product.slug == slug).first()
+        return product_snapshot(p) if p else None
+    return catalog_cache.get_or_set(f'product:{slug}', load)
+
+
+# Trending and related lists come from ranking.py's lookup tables: one join
+# walking the ranking table's primary key, cached for RANKING_CACHE_TTL.
+# Products taken off sale or sold out since the last ranking run are skipped.
+def get_trending(limit):
+    def load():
+        rows = (product_query().join(TrendingProduct, TrendingProduct.product_id == Product.id)
+                .filter(in_stock())
+                .order_by(TrendingProduct.rank).limit(limit)
+                .add_columns(TrendingProduct.computed_at).all())
+        return {
+            'computed_at': rows[0][1] if rows else None,
+            'products': [product_snapshot(p) for p, _ in rows],
+        }
+    return catalog_cache.get_or_set(f'home:trending:{limit}', load, ttl=current_app.config.get('RANKING_CACHE_TTL'))
+
+
+def get_related(product_id, limit):
+    def load():
+        return [product_snapshot(p) for p in (
+            product_query().join(RelatedProduct, RelatedProduct.related_id == Product.id)
+            .filter(RelatedProduct.product_id == product_id, in_stock())
+            .order_by(RelatedProduct.rank).limit(limit)
+        )]
+    return catalog_cache.get_or_set(f'related:{product_id}:{limit}', load, ttl=current_app.config.get('RANKING_CACHE_TTL'))
+
+
+# ---------- Invalidation ----------
+def invalidate_product(slugs=(), category_ids=()):
+    # Called by the admin write paths after commit. Pass both the old and new
+    # slug / category so renames and moves drop every stale entry.
+    catalog_cache.invalidate(VERSION_KEY, FACETS_KEY, *{f'product:{s}' for s in slugs if s})
+    # Any product may appear in another's related list, so those all go too.
+    catalog_cache.invalidate_prefix('home:', 'related:', *{f'category:{c}:' for c in category_ids if c})
+
+
+def invalidate_categories():
+    catalog_cache.invalidate(VERSION_KEY, FACETS_KEY, 'categories')
+
+
+def init_app(app):
+    app.jinja_env.globals['categories_version'] = categories_version
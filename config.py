@@ -1,8 +1,10 @@
 import os
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables once, at import (not per worker): ventro.env
+# next to this file, then a .env in the working directory.
 load_dotenv(os.path.join(os.path.dirname(__file__), 'ventro.env'))
+load_dotenv()
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 INSTANCE_DIR = os.path.join(BASE_DIR, 'instance')
@@ -10,7 +12,141 @@ os.makedirs(INSTANCE_DIR, exist_ok=True)
 
 DB_PATH = os.path.join(INSTANCE_DIR, 'ventro.db')
 
+
+def database_url():
+    # DATABASE_URL selects the database (and engine profile, see database.py);
+    # without it the bundled SQLite file is used. Heroku/Render style
+    # "postgres://" URLs are rewritten to the name SQLAlchemy expects.
+    url = os.getenv('DATABASE_URL')
+    if not url:
+        return f"sqlite:///{DB_PATH}"
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'fallback_secret')
-    SQLALCHEMY_DATABASE_URI = f"sqlite:///{DB_PATH}"  # ✅ FIXED HERE
+    SQLALCHEMY_DATABASE_URI = database_url()  # ✅ FIXED HERE
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Engine tuning (see database.py for the defaults). SQLite: WAL,
+    # synchronous=NORMAL, busy_timeout and mmap. Server databases: pool
+    # sizing, pre-ping, recycling and a per-statement timeout.
+    DB_PROFILE = os.getenv('DB_PROFILE', 'auto')
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS')
+    SQLITE_BUSY_TIMEOUT = os.getenv('SQLITE_BUSY_TIMEOUT')
+    SQLITE_MMAP_SIZE = os.getenv('SQLITE_MMAP_SIZE')
+    SQLITE_CACHE_SIZE = os.getenv('SQLITE_CACHE_SIZE')
+    DB_POOL_SIZE = os.getenv('DB_POOL_SIZE')
+    DB_MAX_OVERFLOW = os.getenv('DB_MAX_OVERFLOW')
+    DB_POOL_TIMEOUT = os.getenv('DB_POOL_TIMEOUT')
+    DB_POOL_RECYCLE = os.getenv('DB_POOL_RECYCLE')
+    DB_CONNECT_TIMEOUT = os.getenv('DB_CONNECT_TIMEOUT')
+    DB_STATEMENT_TIMEOUT = os.getenv('DB_STATEMENT_TIMEOUT')
+
+    # Catalog read-through cache (see cache.py). "sqlite" shares one cache file
+    # between all gunicorn workers on a host; use "memory" for a single
+    # process or "redis" (with CATALOG_CACHE_URL) across hosts.
+    CATALOG_CACHE_BACKEND = os.getenv('CATALOG_CACHE_BACKEND', 'sqlite')
+    CATALOG_CACHE_PATH = os.getenv('CATALOG_CACHE_PATH', os.path.join(INSTANCE_DIR, 'catalog_cache.db'))
+    CATALOG_CACHE_URL = os.getenv('CATALOG_CACHE_URL')
+    CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 300))
+    CATALOG_CACHE_MAX_ENTRIES = int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', 1024))
+
+    # Rendered product cards and the category sidebar (see fragments.py).
+    # Keys carry product.updated_at / the category list version, so entries
+    # never need invalidating; "memory" is a bounded per-process LRU.
+    FRAGMENT_CACHE_BACKEND = os.getenv('FRAGMENT_CACHE_BACKEND', 'memory')
+    FRAGMENT_CACHE_PATH = os.getenv('FRAGMENT_CACHE_PATH', os.path.join(INSTANCE_DIR, 'fragment_cache.db'))
+    FRAGMENT_CACHE_URL = os.getenv('FRAGMENT_CACHE_URL')
+    FRAGMENT_CACHE_TTL = int(os.getenv('FRAGMENT_CACHE_TTL', 3600))
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', 5000))
+    FRAGMENT_CACHE_VERSION = os.getenv('FRAGMENT_CACHE_VERSION', '')
+
+    # Conditional GET on catalog pages (see httpcache.py): ETag/Last-Modified
+    # and 304s; anonymous pages may be kept by a CDN for this many seconds.
+    CATALOG_CONDITIONAL_GET = os.getenv('CATALOG_CONDITIONAL_GET', '1') not in ('0', 'false', 'False')
+    CATALOG_SHARED_MAX_AGE = int(os.getenv('CATALOG_SHARED_MAX_AGE', 60))
+
+    # Request metrics (see metrics.py), scraped from /metrics. Under gunicorn
+    # each worker writes its numbers to METRICS_DIR so a scrape sees them all.
+    # /metrics needs METRICS_TOKEN as a bearer token, except under the debug
+    # server and in tests; without one it answers 403.
+    # Requests slower than SLOW_REQUEST_MS are logged; a sampled fraction is
+    # profiled and, when slow, logged with their hottest functions.
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') not in ('0', 'false', 'False')
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    METRICS_DIR = os.getenv('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+    SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 500))
+    SLOW_REQUEST_PROFILE_RATE = float(os.getenv('SLOW_REQUEST_PROFILE_RATE', 0))
+    SLOW_REQUEST_PROFILE_DIR = os.getenv('SLOW_REQUEST_PROFILE_DIR')
+
+    # Passwords (see passwords.py). Hashing runs on PASSWORD_HASH_WORKERS
+    # threads per process (0 = inline) with at most PASSWORD_HASH_QUEUE
+    # waiting; stored hashes are upgraded to PASSWORD_HASH_METHOD on login.
+    # Failed logins are limited per username and per address in a window.
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 1))
+    PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 8))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 5))
+    LOGIN_MAX_ATTEMPTS = int(os.getenv('LOGIN_MAX_ATTEMPTS', 5))
+    LOGIN_IP_MAX_ATTEMPTS = int(os.getenv('LOGIN_IP_MAX_ATTEMPTS', 30))
+    LOGIN_ATTEMPT_WINDOW = int(os.getenv('LOGIN_ATTEMPT_WINDOW', 300))
+    LOGIN_THROTTLE_BACKEND = os.getenv('LOGIN_THROTTLE_BACKEND', 'sqlite')
+    LOGIN_THROTTLE_PATH = os.getenv('LOGIN_THROTTLE_PATH', os.path.join(INSTANCE_DIR, 'login_throttle.db'))
+    LOGIN_THROTTLE_URL = os.getenv('LOGIN_THROTTLE_URL')
+    LOGIN_THROTTLE_MAX_ENTRIES = int(os.getenv('LOGIN_THROTTLE_MAX_ENTRIES', 10000))
+
+    # Server-side sessions (see session_store.py). The cookie only carries a
+    # signed session id; the cart and login state live in the backend.
+    SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'sqlite')
+    SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', os.path.join(INSTANCE_DIR, 'sessions.db'))
+    SESSION_TTL = int(os.getenv('SESSION_TTL', 7 * 24 * 3600))
+    SESSION_MAX_ENTRIES = int(os.getenv('SESSION_MAX_ENTRIES', 10000))
+    SESSION_CLEANUP_INTERVAL = int(os.getenv('SESSION_CLEANUP_INTERVAL', 300))
+
+    # Payments (see payments.py). "stub" fakes the provider for local
+    # development and benchmarks. The Stripe client is only created on the
+    # first checkout or webhook.
+    STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY')
+    STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
+    PAYMENT_BACKEND = os.getenv('PAYMENT_BACKEND', 'stripe')
+    STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+    STRIPE_TIMEOUT = float(os.getenv('STRIPE_TIMEOUT', 10))
+    STRIPE_MAX_RETRIES = int(os.getenv('STRIPE_MAX_RETRIES', 1))
+    TASK_WORKERS = int(os.getenv('TASK_WORKERS', 2))
+
+    # Admin image uploads (see uploads.py): streamed to a temp file under
+    # static/images/products/uploads/ and stored by content hash. A custom
+    # UPLOAD_TMP_DIR must be on the same filesystem as static/.
+    UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', 10 * 1024 * 1024))
+    UPLOAD_TMP_DIR = os.getenv('UPLOAD_TMP_DIR')
+
+    # Trending and related products (see ranking.py), rebuilt by
+    # `python ranking.py` (e.g. hourly from cron). Trending adds up units
+    # ordered plus TRENDING_VIEW_WEIGHT per product view over TRENDING_DAYS,
+    # each day counting half as much every TRENDING_HALF_LIFE_DAYS. Related
+    # lists come from orders placed in the last RELATED_ORDER_DAYS. Pages
+    # cache both for RANKING_CACHE_TTL seconds; views are written every
+    # VIEW_FLUSH_INTERVAL seconds.
+    TRENDING_LIMIT = int(os.getenv('TRENDING_LIMIT', 8))
+    TRENDING_DAYS = int(os.getenv('TRENDING_DAYS', 14))
+    TRENDING_HALF_LIFE_DAYS = float(os.getenv('TRENDING_HALF_LIFE_DAYS', 3))
+    TRENDING_VIEW_WEIGHT = float(os.getenv('TRENDING_VIEW_WEIGHT', 0.05))
+    RELATED_LIMIT = int(os.getenv('RELATED_LIMIT', 4))
+    RELATED_ORDER_DAYS = int(os.getenv('RELATED_ORDER_DAYS', 180))
+    RANKING_CACHE_TTL = int(os.getenv('RANKING_CACHE_TTL', 300))
+    VIEW_FLUSH_INTERVAL = int(os.getenv('VIEW_FLUSH_INTERVAL', 30))
+
+    # Stock reservations (see inventory.py). Checkout takes stock for
+    # RESERVATION_TTL seconds; the provider session gets a minute more, and
+    # with Stripe the TTL must be 30 min to 24 h (checked at startup). Unpaid
+    # orders are expired and restocked RESERVATION_GRACE seconds after that,
+    # checked every RESERVATION_SWEEP_INTERVAL seconds or by
+    # `python inventory.py`.
+    RESERVATION_TTL = int(os.getenv('RESERVATION_TTL', 1800))
+    RESERVATION_GRACE = int(os.getenv('RESERVATION_GRACE', 300))
+    RESERVATION_SWEEP_INTERVAL = int(os.getenv('RESERVATION_SWEEP_INTERVAL', 60))
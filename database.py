@@ -0,0 +1,93 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from models import db
+
+# Engine profiles, picked from the database URL (DATABASE_URL in config.py).
+# DB_PROFILE=default skips all tuning and uses SQLAlchemy's defaults, which
+# is only useful for comparing against (see benchmarks/db_writes.py).
+SQLITE_DEFAULTS = {
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_BUSY_TIMEOUT': 5000,          # ms
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    'SQLITE_CACHE_SIZE': -16000,          # negative = KiB, so ~16 MB per connection
+}
+
+SERVER_DEFAULTS = {
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    'DB_POOL_TIMEOUT': 10,                # seconds to wait for a free connection
+    'DB_POOL_RECYCLE': 1800,
+    'DB_CONNECT_TIMEOUT': 5,
+    'DB_STATEMENT_TIMEOUT': 5000,         # ms
+}
+
+
+def _setting(config, key, defaults):
+    value = config.get(key)
+    return defaults[key] if value is None else value
+
+
+def profile_for(config):
+    if config.get('DB_PROFILE', 'auto') == 'default':
+        return 'default'
+    backend = make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    return 'sqlite' if backend == 'sqlite' else 'server'
+
+
+def sqlite_pragmas(config):
+    return [
+        f"PRAGMA journal_mode={_setting(config, 'SQLITE_JOURNAL_MODE', SQLITE_DEFAULTS)}",
+        f"PRAGMA synchronous={_setting(config, 'SQLITE_SYNCHRONOUS', SQLITE_DEFAULTS)}",
+        f"PRAGMA busy_timeout={int(_setting(config, 'SQLITE_BUSY_TIMEOUT', SQLITE_DEFAULTS))}",
+        f"PRAGMA mmap_size={int(_setting(config, 'SQLITE_MMAP_SIZE', SQLITE_DEFAULTS))}",
+        f"PRAGMA cache_size={int(_setting(config, 'SQLITE_CACHE_SIZE', SQLITE_DEFAULTS))}",
+    ]
+
+
+def engine_options(config):
+    # Keyword arguments for create_engine(); ends up in SQLALCHEMY_ENGINE_OPTIONS.
+    profile = profile_for(config)
+    if profile == 'sqlite':
+        # The driver-level timeout matches busy_timeout so a write waits for
+        # the lock instead of failing with "database is locked".
+        timeout = int(_setting(config, 'SQLITE_BUSY_TIMEOUT', SQLITE_DEFAULTS)) / 1000
+        return {'connect_args': {'timeout': timeout}}
+    if profile == 'server':
+        connect_args = {}
+        if make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name() == 'postgresql':
+            connect_args = {
+                'connect_timeout': int(_setting(config, 'DB_CONNECT_TIMEOUT', SERVER_DEFAULTS)),
+                'options': f"-c statement_timeout={int(_setting(config, 'DB_STATEMENT_TIMEOUT', SERVER_DEFAULTS))}",
+            }
+        return {
+            'pool_size': int(_setting(config, 'DB_POOL_SIZE', SERVER_DEFAULTS)),
+            'max_overflow': int(_setting(config, 'DB_MAX_OVERFLOW', SERVER_DEFAULTS)),
+            'pool_timeout': int(_setting(config, 'DB_POOL_TIMEOUT', SERVER_DEFAULTS)),
+            'pool_recycle': int(_setting(config, 'DB_POOL_RECYCLE', SERVER_DEFAULTS)),
+            'pool_pre_ping': True,
+            'connect_args': connect_args,
+        }
+    return {}
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def init_app(app):
+    # Replaces db.init_app(app): the engine options must be in the config
+    # before Flask-SQLAlchemy builds the engine.
+    options = engine_options(app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    db.init_app(app)
+    if profile_for(app.config) == 'sqlite':
+        with app.app_context():
+            apply_sqlite_pragmas(db.engine, sqlite_pragmas(app.config))
@@ -1,11 +1,24 @@
+import argparse
+import hashlib
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ==== 🔧 CONFIGURATION ====
-API_KEY = "53093716-d5d430fc9b7a99928f82963aa"
+API_KEY = os.getenv("PIXABAY_API_KEY", "53093716-d5d430fc9b7a99928f82963aa")
 base_dir = os.path.dirname(os.path.abspath(__file__))
 save_dir = os.path.join(base_dir, "static", "images", "products")
-os.makedirs(save_dir, exist_ok=True)
+STATE_FILE = ".download_state.json"  # ETag / hash per file, to skip unchanged images
+
+TIMEOUT = (5, 30)  # (connect, read) seconds
+CHUNK_SIZE = 64 * 1024
 
 # ==== 🛒 PRODUCT SEARCH TERMS ====
 products = {
@@ -46,23 +59,181 @@ products = {
     "product35.jpg": "car phone mount"
 }
 
+# ==== 🌐 IMAGE SOURCES ====
+# A source turns a search keyword into an image URL. Swap in LocalSource to run
+# against a fixture server (e.g. `python -m http.server` over a folder of
+# "<keyword>.jpg" files) instead of Pixabay.
+class PixabaySource:
+    def __init__(self, api_key, api_url="https://pixabay.com/api/"):
+        self.api_key = api_key
+        self.api_url = api_url
+
+    def image_url(self, http, keyword):
+        response = http.get(
+            self.api_url,
+            params={"key": self.api_key, "q": keyword, "image_type": "photo", "per_page": 3},
+            timeout=TIMEOUT,
+        )
+        response.raise_for_status()
+        hits = response.json().get("hits") or []
+        return hits[0]["largeImageURL"] if hits else None
+
+
+class LocalSource:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def image_url(self, http, keyword):
+        return f"{self.base_url}/{quote(keyword)}.jpg"
+
+
+SOURCES = {
+    "pixabay": lambda args: PixabaySource(args.api_key),
+    "local": lambda args: LocalSource(args.base_url),
+}
+
+
+# ==== 🔌 HTTP ====
+_local = threading.local()
+
+
+def http_session(pool_size):
+    # One pooled, retrying session per worker thread (requests.Session is not
+    # thread-safe); connections are kept alive across that thread's downloads.
+    http = getattr(_local, "http", None)
+    if http is None:
+        retry = Retry(
+            total=4,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        http = requests.Session()
+        http.mount("http://", adapter)
+        http.mount("https://", adapter)
+        _local.http = http
+    return http
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
 # ==== 🚀 DOWNLOAD IMAGES ====
-for filename, keyword in products.items():
-    query = keyword.replace(" ", "+")
-    url = f"https://pixabay.com/api/?key={API_KEY}&q={query}&image_type=photo&per_page=3"
-    
+def download_one(source, filename, keyword, previous, target_dir, pool_size):
+    # Returns (status, state) where status is "saved", "unchanged" or "missing".
+    http = http_session(pool_size)
+    path = os.path.join(target_dir, filename)
+    image_url = source.image_url(http, keyword)
+    if not image_url:
+        return "missing", previous
+
+    headers = {}
+    if previous and previous.get("url") == image_url and os.path.exists(path):
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        with http.get(image_url, headers=headers, timeout=TIMEOUT, stream=True) as response:
+            if response.status_code == 304:
+                return "unchanged", previous
+            response.raise_for_status()
+            h = hashlib.sha256()
+            with open(tmp, "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    h.update(chunk)
+                    f.write(chunk)
+            state = {
+                "url": image_url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha256": h.hexdigest(),
+            }
+
+        # Same bytes as before: leave the file (and its mtime) alone so image
+        # derivatives and fingerprinted assets aren't rebuilt for nothing.
+        existing = previous.get("sha256") if previous else None
+        if existing is None and os.path.exists(path):
+            existing = file_sha256(path)
+        if existing == state["sha256"]:
+            return "unchanged", state
+        os.replace(tmp, path)
+        return "saved", state
+    finally:
+        # A download that failed half way (or was the same bytes) leaves no
+        # partial file behind; after os.replace() there is nothing to remove.
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_state(target_dir):
     try:
-        response = requests.get(url)
-        data = response.json()
-        if "hits" in data and len(data["hits"]) > 0:
-            image_url = data["hits"][0]["largeImageURL"]
-            image_data = requests.get(image_url).content
-            with open(os.path.join(save_dir, filename), "wb") as f:
-                f.write(image_data)
-            print(f"✅ Saved: {filename} ({keyword})")
-        else:
-            print(f"⚠️ No image found for: {keyword}")
-    except Exception as e:
-        print(f"❌ Error downloading {keyword}: {e}")
-
-print(f"\n🎉 All images saved in: {save_dir}")
+        with open(os.path.join(target_dir, STATE_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(target_dir, state):
+    path = os.path.join(target_dir, STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def download_all(source, items, target_dir, workers=8):
+    os.makedirs(target_dir, exist_ok=True)
+    state = load_state(target_dir)
+    counts = {"saved": 0, "unchanged": 0, "missing": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(download_one, source, filename, keyword, state.get(filename), target_dir, workers): (filename, keyword)
+            for filename, keyword in items.items()
+        }
+        for future in as_completed(futures):
+            filename, keyword = futures[future]
+            try:
+                status, file_state = future.result()
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"❌ Error downloading {keyword}: {e}")
+                continue
+            counts[status] += 1
+            if file_state:
+                state[filename] = file_state
+            if status == "saved":
+                print(f"✅ Saved: {filename} ({keyword})")
+            elif status == "missing":
+                print(f"⚠️ No image found for: {keyword}")
+    save_state(target_dir, state)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download product images concurrently.")
+    parser.add_argument("--source", choices=sorted(SOURCES), default="pixabay")
+    parser.add_argument("--api-key", default=API_KEY, help="Pixabay API key")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="base URL for --source local")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent downloads")
+    parser.add_argument("--dest", default=save_dir, help="output directory")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = download_all(SOURCES[args.source](args), products, args.dest, workers=args.workers)
+    print(
+        f"\n🎉 {counts['saved']} saved, {counts['unchanged']} unchanged, {counts['missing']} not found, "
+        f"{counts['failed']} failed in {time.perf_counter() - started:.1f}s → {args.dest}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+from flask import request
+from sqlalchemy import and_, case, delete, func, insert, or_, select
+
+from models import db, Product, CategoryFacet
+
+# ---------- Filters ----------
+# Listing orders, each ending in the primary key so keyset pagination has a
+# total order. Every one is served by a (category_id, <sort>, id) or
+# (<sort>, id) index on product (see models.Product).
+SORTS = {
+    'newest': [(Product.created_at, True), (Product.id, True)],
+    'price_asc': [(Product.price, False), (Product.id, False)],
+    'price_desc': [(Product.price, True), (Product.id, True)],
+}
+SORT_LABELS = {
+    'relevance': 'Best match',
+    'newest': 'Newest',
+    'price_asc': 'Price: low to high',
+    'price_desc': 'Price: high to low',
+}
+DEFAULT_SORT = 'newest'
+
+
+def sort_options(sorts=SORTS):
+    return [(key, SORT_LABELS[key]) for key in sorts]
+
+
+def _int_arg(name):
+    value = request.args.get(name, '').strip()
+    return int(value) if value.isdigit() else None
+
+
+def in_stock():
+    # Listed and not sold out; stock is NULL for products that don't track it.
+    # The Python side is Product.in_stock.
+    return and_(Product.is_available.is_(True), or_(Product.stock.is_(None), Product.stock > 0))
+
+
+def filter_args(sorts=SORTS, default_sort=DEFAULT_SORT):
+    # Bad or missing values are simply ignored, like an unfiltered page.
+    sort = request.args.get('sort', default_sort)
+    return {
+        'min_price': _int_arg('min_price'),
+        'max_price': _int_arg('max_price'),
+        'available': request.args.get('available') == '1',
+        'sort': sort if sort in sorts else default_sort,
+    }
+
+
+def filter_key(filters):
+    # Stable string for cache keys.
+    return f"{filters['sort']}:{filters['min_price'] or ''}:{filters['max_price'] or ''}:{int(filters['available'])}"
+
+
+def apply_filters(query, filters):
+    if filters['min_price'] is not None:
+        query = query.filter(Product.price >= filters['min_price'])
+    if filters['max_price'] is not None:
+        query = query.filter(Product.price <= filters['max_price'])
+    if filters['available']:
+        query = query.filter(in_stock())
+    return query
+
+
+def is_filtered(filters):
+    return filters['min_price'] is not None or filters['max_price'] is not None or filters['available']
+
+
+# ---------- Precomputed facet counts ----------
+def _facet_select(category_ids=None):
+    query = select(
+        Product.category_id,
+        func.count(Product.id),
+        func.sum(case((in_stock(), 1), else_=0)),
+        func.min(Product.price),
+        func.max(Product.price),
+    ).where(Product.category_id.is_not(None)).group_by(Product.category_id)
+    if category_ids is not None:
+        query = query.where(Product.category_id.in_(category_ids))
+    return query
+
+
+def refresh(category_ids=None):
+    # Recounts the given categories (all when None) from product, inside the
+    # caller's transaction: call before commit from every write path that adds,
+    # moves, reprices or (un)lists products, then drop the cached copy with
+    # catalog.invalidate_product(). Each category is one indexed range scan.
+    if category_ids is not None:
+        category_ids = sorted({int(c) for c in category_ids if c})
+        if not category_ids:
+            return
+    db.session.flush()
+    stmt = delete(CategoryFacet)
+    if category_ids is not None:
+        stmt = stmt.where(CategoryFacet.category_id.in_(category_ids))
+    db.session.execute(stmt)
+    db.session.execute(insert(CategoryFacet).from_select(
+        ['category_id', 'products', 'available', 'min_price', 'max_price'],
+        _facet_select(category_ids),
+    ))
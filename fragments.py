@@ -0,0 +1,61 @@
+import hashlib
+from datetime import date, datetime
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from cache import NullBackend, make_backend
+
+# Template fragment cache:
+#
+#   {% cache 'home-card', p.id, p.updated_at %} ...card markup... {% endcache %}
+#
+# The key parts say what the fragment depends on, so nothing is ever
+# invalidated: when a product is saved its updated_at moves on and the next
+# render uses (and stores) a new key, while the old entry ages out of the LRU.
+
+
+def _key_part(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=NullBackend(), fragment_cache_ttl=3600, fragment_cache_version='')
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render', [nodes.List(parts)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        env = self.environment
+        key = env.fragment_cache_version + ':'.join(_key_part(p) for p in parts)
+        html = env.fragment_cache.get(key)
+        if html is None:
+            html = caller()
+            env.fragment_cache.set(key, str(html), env.fragment_cache_ttl)
+        return Markup(html)
+
+
+def init_app(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    env = app.jinja_env
+    env.fragment_cache = make_backend(app, 'FRAGMENT_CACHE', namespace='ventro:fragments:')
+    env.fragment_cache_ttl = app.config.get('FRAGMENT_CACHE_TTL', 3600)
+    # Rendered markup also depends on things outside the key parts: the
+    # fingerprinted asset URLs and the deploy itself. Fold those into every
+    # key so a shared backend never serves another build's HTML.
+    version = app.extensions.get('asset_version', '') + str(app.config.get('FRAGMENT_CACHE_VERSION', ''))
+    env.fragment_cache_version = hashlib.sha256(version.encode('utf-8')).hexdigest()[:8] + ':'
@@ -0,0 +1,51 @@
+import gc
+import os
+
+# Load the app once in the master and fork workers from it: a new or
+# respawned worker starts with everything imported and create_app() done,
+# and the memory is shared copy-on-write between workers.
+preload_app = True
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 20
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# Workers share their request metrics through this directory (see metrics.py).
+os.environ.setdefault('METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'metrics'))
+
+
+def on_starting(server):
+    # Counts from a previous run of the master would otherwise be added in.
+    import metrics
+    if os.path.isdir(os.environ['METRICS_DIR']):
+        metrics.clear_dir(os.environ['METRICS_DIR'])
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the garbage collector's reach,
+    # so collections in the workers don't touch (and copy) the shared pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Never share database connections across processes. The preloaded app
+    # shouldn't have opened any, but drop the pool's references without
+    # closing them (close=False) in case it did, so the master's are untouched.
+    from models import db
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    # Keep the requests a recycled worker (max_requests) served since its last flush.
+    import metrics
+    import ranking
+    metrics.registry.maybe_flush(os.environ['METRICS_DIR'], 0)
+    # Likewise the product views counted since the last write.
+    with server.app.wsgi().app_context():
+        ranking.flush_views()
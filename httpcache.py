@@ -0,0 +1,52 @@
+import hashlib
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+
+# Conditional GET for catalog pages. The view passes whatever versions the
+# page (the catalog timestamp, a product's updated_at, ...); the ETag is
+# built from those plus the viewer state the shared layout shows (login and
+# cart), so a matching If-None-Match / If-Modified-Since gets a 304 before
+# any template is rendered.
+
+
+def _viewer_key():
+    user = current_user.get_id() if current_user.is_authenticated else ''
+    cart = session.get('cart') or {}
+    return f"{user}|{sorted(cart.items())}"
+
+
+def _is_shared():
+    # Anonymous visitors with an empty cart all see the same page, so
+    # reverse proxies / CDNs may store it.
+    return not current_user.is_authenticated and not session.get('cart')
+
+
+def conditional(render, *parts, last_modified=None):
+    # Pending flash messages are shown once, so those responses are never
+    # conditional or cacheable.
+    if not current_app.config.get('CATALOG_CONDITIONAL_GET', True) or '_flashes' in session:
+        return render()
+
+    key = '|'.join(str(p) for p in (current_app.extensions.get('asset_version', ''), *parts, _viewer_key()))
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.vary.add('Cookie')
+    # Browsers always revalidate (max-age=0); shared caches may reuse an
+    # anonymous page for CATALOG_SHARED_MAX_AGE seconds.
+    if _is_shared():
+        response.cache_control.public = True
+        response.cache_control.max_age = 0
+        response.cache_control.s_maxage = current_app.config.get('CATALOG_SHARED_MAX_AGE', 60)
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
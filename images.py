@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+
+from flask import current_app, url_for
+from markupsafe import Markup, escape
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow missing: pages fall back to the original image
+    Image = None
+
+log = logging.getLogger(__name__)
+
+DEFAULT_IMAGE = 'images/products/default.jpg'
+DERIVED_DIR = 'images/products/derived'
+
+# name -> target width in pixels. Cards use "thumb", the product page "medium".
+SIZES = {'thumb': 320, 'medium': 768}
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 75, 'method': 4},
+    'jpg': {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True},
+}
+
+CARD_SIZES = '(max-width: 600px) 50vw, 260px'
+DETAIL_SIZES = '(max-width: 900px) 100vw, 600px'
+
+
+# ---------- Paths ----------
+def derivative_name(image, size, ext):
+    # images/products/product1.jpg -> images/products/derived/product1-320.webp
+    stem = os.path.splitext(os.path.basename(image))[0]
+    return f'{DERIVED_DIR}/{stem}-{SIZES[size]}.{ext}'
+
+
+def _static_path(static_folder, name):
+    return os.path.join(static_folder, *name.split('/'))
+
+
+# ---------- Generation ----------
+def generate_derivatives(static_folder, image, force=False):
+    # Writes every size/format for one source image and returns the relative
+    # names it (re)built. Up-to-date derivatives are skipped unless `force`.
+    source = _static_path(static_folder, image)
+    if Image is None or not image or not os.path.isfile(source):
+        return []
+    source_mtime = os.path.getmtime(source)
+    targets = {
+        (size, ext): derivative_name(image, size, ext)
+        for size in SIZES for ext in FORMATS
+    }
+    stale = {
+        key: name for key, name in targets.items()
+        if force or not os.path.exists(_static_path(static_folder, name))
+        or os.path.getmtime(_static_path(static_folder, name)) < source_mtime
+    }
+    if not stale:
+        return []
+
+    os.makedirs(_static_path(static_folder, DERIVED_DIR), exist_ok=True)
+    try:
+        with Image.open(source) as opened:
+            original = ImageOps.exif_transpose(opened).convert('RGB')
+    except OSError as exc:
+        # Unreadable or unsupported (e.g. AVIF saved as .jpg): keep serving
+        # the original rather than failing the caller.
+        log.warning("Cannot build derivatives for %s: %s", image, exc)
+        return []
+    for (size, ext), name in stale.items():
+        width = min(SIZES[size], original.width)
+        height = round(original.height * width / original.width)
+        resized = original.resize((width, height), Image.LANCZOS)
+        # Write then rename so a concurrent request never serves half a file.
+        path = _static_path(static_folder, name)
+        # Unique per thread too: queued jobs for one image can overlap.
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        resized.save(tmp, **FORMATS[ext])
+        os.replace(tmp, path)
+    _available.pop(image, None)
+    return list(stale.values())
+
+
+# ---------- Template helpers ----------
+# Positive lookups are kept for the life of the process (derivatives are never
+# deleted). Negative ones hold until the derived directory changes: every build
+# renames its files into it, so one stat of the directory tells whether images
+# built by the task queue, another worker or the batch CLI could have appeared.
+_available = {}
+
+
+def _derived_stamp(static_folder):
+    try:
+        return os.stat(_static_path(static_folder, DERIVED_DIR)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def has_derivatives(image):
+    image = image or DEFAULT_IMAGE
+    entry = _available.get(image)
+    if entry is True:
+        return True
+    static_folder = current_app.static_folder
+    stamp = _derived_stamp(static_folder)
+    if entry is not None and entry == ('missing', stamp):
+        return False
+    found = all(
+        os.path.exists(_static_path(static_folder, derivative_name(image, size, ext)))
+        for size in SIZES for ext in FORMATS
+    )
+    _available[image] = True if found else ('missing', stamp)
+    return found
+
+
+def srcset(image, ext):
+    return ', '.join(
+        f"{url_for('static', filename=derivative_name(image, size, ext))} {SIZES[size]}w"
+        for size in SIZES
+    )
+
+
+def product_image(image, alt='', size='thumb', **attrs):
+    # <picture> with WebP + JPEG srcsets when derivatives exist; otherwise a
+    # plain <img> of the original so nothing breaks before the CLI has run.
+    image = image or DEFAULT_IMAGE
+    sizes = CARD_SIZES if size == 'thumb' else DETAIL_SIZES
+    # Cards below the fold load lazily; the product page image is the LCP.
+    attrs.setdefault('loading', 'lazy' if size == 'thumb' else 'eager')
+    extra = ''.join(f' {escape(k.rstrip("_").replace("_", "-"))}="{escape(v)}"' for k, v in attrs.items())
+    if not has_derivatives(image):
+        src = url_for('static', filename=image)
+        return Markup(f'<img src="{escape(src)}" alt="{escape(alt)}"{extra}>')
+    fallback = url_for('static', filename=derivative_name(image, size, 'jpg'))
+    return Markup(
+        f'<picture>'
+        f'<source type="image/webp" srcset="{escape(srcset(image, "webp"))}" sizes="{escape(sizes)}">'
+        f'<img src="{escape(fallback)}" srcset="{escape(srcset(image, "jpg"))}" sizes="{escape(sizes)}"'
+        f' alt="{escape(alt)}" decoding="async"{extra}>'
+        f'</picture>'
+    )
+
+
+def init_app(app):
+    app.jinja_env.globals['product_image'] = product_image
+    app.jinja_env.globals['has_derivatives'] = has_derivatives
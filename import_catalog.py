@@ -0,0 +1,196 @@
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import select
+
+import facets
+from cache import catalog_cache
+from models import db, dialect_insert, Category, Product
+
+DEFAULT_CHUNK_SIZE = 5000
+_SLUG_RE = re.compile(r'[^a-z0-9]+')
+
+# Columns overwritten when a slug already exists. created_at is left alone so
+# re-importing doesn't reshuffle "newest first" listings.
+UPDATE_COLUMNS = ('title', 'description', 'price', 'image', 'category_id', 'is_available')
+
+
+def slugify(value):
+    return _SLUG_RE.sub('-', value.lower()).strip('-')
+
+
+# ---------- Readers ----------
+# Both yield plain dicts one line at a time, so memory stays flat however big
+# the file is.
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def read_file(path):
+    if path.endswith(('.jsonl', '.ndjson')):
+        return read_jsonl(path)
+    return read_csv(path)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ---------- Upserts ----------
+def _parse_bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'on')
+
+
+class CategoryMap:
+    # slug -> id for every category, loaded once; unknown slugs are upserted
+    # in one statement per chunk instead of one SELECT per row. A new slug
+    # whose name already exists maps onto that category (names are unique).
+    def __init__(self, conn):
+        self.conn = conn
+        self.ids = {}
+        self.names = {}
+        for slug, name, id_ in conn.execute(select(Category.slug, Category.name, Category.id)):
+            self.ids[slug] = id_
+            self.names[name.lower()] = id_
+
+    def resolve(self, wanted):
+        missing = {}
+        for slug, name in wanted.items():
+            if slug in self.ids:
+                continue
+            if name.lower() in self.names:
+                self.ids[slug] = self.names[name.lower()]
+            else:
+                missing[slug] = name
+        if missing:
+            stmt = dialect_insert(Category.__table__).on_conflict_do_nothing()
+            self.conn.execute(stmt, [{'slug': s, 'name': n} for s, n in missing.items()])
+            for slug, name, id_ in self.conn.execute(
+                select(Category.slug, Category.name, Category.id).where(Category.slug.in_(list(missing)))
+            ):
+                self.ids[slug] = id_
+                self.names[name.lower()] = id_
+        return self.ids
+
+
+def _normalize(raw):
+    title = (raw.get('title') or '').strip()
+    price = raw.get('price')
+    if not title or price in (None, ''):
+        return None
+    category_name = (raw.get('category') or raw.get('category_name') or '').strip()
+    category_slug = (raw.get('category_slug') or '').strip() or (slugify(category_name) if category_name else '')
+    return {
+        'title': title,
+        'slug': (raw.get('slug') or '').strip() or slugify(title),
+        'description': raw.get('description') or None,
+        'price': int(float(price)),
+        'image': raw.get('image') or None,
+        'is_available': _parse_bool(raw.get('is_available')),
+        'category_slug': category_slug,
+        'category_name': category_name or category_slug.replace('-', ' ').title(),
+    }
+
+
+def import_rows(rows, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    # Upserts products (on slug) and their categories (on slug) chunk by
+    # chunk, one transaction per chunk. Returns counters for reporting.
+    stats = {'rows': 0, 'skipped': 0, 'chunks': 0, 'seconds': 0.0}
+    started = time.perf_counter()
+    with db.engine.connect() as conn:
+        categories = CategoryMap(conn)
+        conn.commit()
+        for chunk in chunked(rows, chunk_size):
+            products = {}
+            wanted = {}
+            for raw in chunk:
+                try:
+                    row = _normalize(raw)
+                except (TypeError, ValueError):
+                    row = None
+                if row is None:
+                    stats['skipped'] += 1
+                    continue
+                if row['category_slug']:
+                    wanted[row['category_slug']] = row['category_name']
+                # Last occurrence wins when a chunk repeats a slug.
+                products[row['slug']] = row
+            if products:
+                ids = categories.resolve(wanted)
+                values = [
+                    {
+                        'title': r['title'], 'slug': r['slug'], 'description': r['description'],
+                        'price': r['price'], 'image': r['image'], 'is_available': r['is_available'],
+                        'category_id': ids.get(r['category_slug']),
+                    }
+                    for r in products.values()
+                ]
+                stmt = dialect_insert(Product.__table__)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['slug'],
+                    set_={**{c: stmt.excluded[c] for c in UPDATE_COLUMNS}, 'updated_at': datetime.utcnow()},
+                )
+                conn.execute(stmt, values)
+            conn.commit()
+            stats['rows'] += len(products)
+            stats['chunks'] += 1
+            stats['seconds'] = time.perf_counter() - started
+            if progress:
+                progress(stats)
+    # Category facet counts are recounted once for the whole import.
+    facets.refresh()
+    db.session.commit()
+    stats['seconds'] = time.perf_counter() - started
+    # One invalidation for the whole import rather than per row.
+    catalog_cache.clear()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import products from CSV or JSONL (upsert on slug).")
+    parser.add_argument('path', help="CSV with a header row, or .jsonl with one product per line")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    if not os.path.isfile(args.path):
+        raise SystemExit(f"❌ No such file: {args.path}")
+
+    from app import create_app
+    app = create_app()
+
+    def report(stats):
+        rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+        print(f"📦 {stats['rows']:,} rows ({rate:,.0f} rows/s)", end='\r', flush=True)
+
+    with app.app_context():
+        stats = import_rows(read_file(args.path), chunk_size=args.chunk_size, progress=report)
+    rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+    print(f"\n🎉 Imported {stats['rows']:,} products in {stats['seconds']:.1f}s "
+          f"({rate:,.0f} rows/s, {stats['skipped']:,} skipped)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 from app import create_app
 from models import db
+from bootstrap import upgrade
 import runpy
 import os
 
@@ -8,7 +9,7 @@ app = create_app()
 with app.app_context():
     print("🧹 Dropping and recreating tables...")
     db.drop_all()
-    db.create_all()
+    upgrade()
     print("✅ Tables recreated successfully!")
 
     # Now run seeding file
@@ -0,0 +1,180 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import case, delete, func, select, update
+
+import analytics
+import catalog
+import facets
+from models import db, Order, Product, StockReservation
+from tasks import task_queue
+
+# Stock is taken at checkout, not when the order is paid: a conditional
+#
+#   UPDATE product SET stock = stock - :qty WHERE id = :id AND stock >= :qty
+#
+# either takes the units or touches nothing, so concurrent checkouts can't
+# oversell and never read-modify-write. Each taken line is also recorded as a
+# StockReservation that lives as long as the provider's checkout session.
+# The payment webhook settles it (paid: sold; failed / expired: restocked)
+# and sweep() expires whatever the provider never reported back.
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(f"product {product_id} is out of stock")
+        self.product_id = product_id
+
+
+# ---------- Reserving ----------
+# Sales leave updated_at alone (stock isn't on any cached page), except when a
+# product sells out or comes back: then updated_at moves on, the category
+# facets are recounted in the same transaction, and the caller drops the
+# product from the catalog cache after commit with invalidate().
+def _touch_if(condition):
+    return case((condition, datetime.utcnow()), else_=Product.updated_at)
+
+
+def reserve(order, lines, ttl):
+    # lines: {product_id: quantity} for products whose stock is tracked.
+    # Call after the order is flushed, as the last writes before the commit:
+    # the stock UPDATEs come after every insert so the hot product rows are
+    # locked (on a server database) for as short a time as possible, and in
+    # product id order so two multi-item checkouts can't deadlock. Raises
+    # OutOfStock; the caller rolls back. Returns the (slug, category_id) of
+    # products that just sold out.
+    expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+    db.session.add_all(
+        StockReservation(order_id=order.id, product_id=product_id, quantity=qty, expires_at=expires_at)
+        for product_id, qty in lines.items()
+    )
+    sold_out = []
+    for product_id in sorted(lines):
+        qty = lines[product_id]
+        taken = db.session.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock >= qty)
+            .values(stock=Product.stock - qty, updated_at=_touch_if(Product.stock - qty <= 0))
+            .returning(Product.slug, Product.category_id, Product.stock)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if taken is None:
+            raise OutOfStock(product_id)
+        if taken.stock <= 0:
+            sold_out.append((taken.slug, taken.category_id))
+    facets.refresh(c for _, c in sold_out)
+    return sold_out
+
+
+def invalidate(changed):
+    # After commit, with what reserve() / settle() / sweep() returned.
+    if changed:
+        catalog.invalidate_product({slug for slug, _ in changed}, {c for _, c in changed})
+
+
+# ---------- Settling ----------
+def _restock(order_ids):
+    reserved = db.session.execute(
+        select(StockReservation.product_id, func.sum(StockReservation.quantity))
+        .where(StockReservation.order_id.in_(order_ids))
+        .group_by(StockReservation.product_id)
+    ).all()
+    back = []
+    for product_id, qty in sorted(reserved):
+        restocked = db.session.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(stock=Product.stock + qty, updated_at=_touch_if(Product.stock <= 0))
+            .returning(Product.slug, Product.category_id, Product.stock)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if restocked is not None and restocked.stock is not None and 0 < restocked.stock <= qty:
+            back.append((restocked.slug, restocked.category_id))
+    facets.refresh(c for _, c in back)
+    return back
+
+
+def _drop(order_ids):
+    db.session.execute(
+        delete(StockReservation)
+        .where(StockReservation.order_id.in_(order_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def settle(order_ids, status):
+    # Inside the transaction that moved the orders to `status`: paid orders
+    # keep their units, failed and expired ones put them back. Returns the
+    # products that are back in stock, for invalidate() after commit.
+    if not order_ids:
+        return []
+    back = _restock(order_ids) if status != 'paid' else []
+    _drop(order_ids)
+    return back
+
+
+# ---------- Sweeper ----------
+def sweep(batch_size=500, grace=None):
+    # Expires pending orders whose reservations ran out more than `grace`
+    # seconds ago (normally the provider's "expired" webhook comes first) and
+    # restocks them, one short transaction per batch. Returns the count.
+    if grace is None:
+        grace = current_app.config.get('RESERVATION_GRACE', 300)
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    expired = 0
+    while True:
+        order_ids = db.session.scalars(
+            select(StockReservation.order_id)
+            .where(StockReservation.expires_at < cutoff)
+            .distinct()
+            .order_by(StockReservation.order_id)
+            .limit(batch_size)
+        ).all()
+        if not order_ids:
+            return expired
+        moved = db.session.execute(
+            update(Order)
+            .where(Order.id.in_(order_ids), Order.status == 'pending')
+            .values(status='expired')
+            .returning(Order.id, Order.created_at, Order.amount)
+            .execution_options(synchronize_session=False)
+        ).all()
+        analytics.record_status_change(moved, 'pending', 'expired')
+        back = settle([row.id for row in moved], 'expired')
+        # Anything left belongs to orders that were settled some other way.
+        _drop(order_ids)
+        db.session.commit()
+        invalidate(back)
+        expired += len(moved)
+
+
+_sweep_lock = threading.Lock()
+_last_sweep = None
+
+
+def maybe_sweep():
+    # Called after each checkout: runs sweep() on the task queue at most once
+    # per RESERVATION_SWEEP_INTERVAL in this process. `python inventory.py`
+    # does the same from cron.
+    global _last_sweep
+    interval = current_app.config.get('RESERVATION_SWEEP_INTERVAL', 60)
+    now = time.monotonic()
+    with _sweep_lock:
+        if _last_sweep is not None and now - _last_sweep < interval:
+            return
+        _last_sweep = now
+    task_queue.submit(sweep)
+
+
+def main():
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        expired = sweep()
+    print(f"✅ Expired {expired} unpaid orders and released their stock")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+import cProfile
+import glob
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+from models import db
+
+log = logging.getLogger(__name__)
+
+# Request instrumentation, exported in the Prometheus text format on /metrics:
+#
+#   ventro_http_request_duration_seconds   per endpoint, method and status
+#   ventro_sql_statement_duration_seconds  every statement, per endpoint
+#   ventro_request_sql_statements          statements per request, per endpoint
+#   ventro_template_render_seconds         per template
+#
+# Requests slower than SLOW_REQUEST_MS are logged with their SQL and template
+# time; a sampled fraction (SLOW_REQUEST_PROFILE_RATE) runs under cProfile and
+# a slow one also logs its hottest functions.
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+HISTOGRAMS = {
+    'ventro_http_request_duration_seconds': ("Time to handle a request, from arrival to response.", TIME_BUCKETS),
+    'ventro_sql_statement_duration_seconds': ("Duration of each SQL statement, by the endpoint that issued it.", SQL_BUCKETS),
+    'ventro_request_sql_statements': ("SQL statements issued per request.", COUNT_BUCKETS),
+    'ventro_template_render_seconds': ("Time spent rendering a template.", TIME_BUCKETS),
+}
+
+PROFILE_LINES = 25
+
+
+# ---------- Registry ----------
+class Registry:
+    # Histograms for this process. Each value is a list of per-bucket counts
+    # (the last one is +Inf) followed by the sum of the observations.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        # A worker's snapshot file outlives it (its counts still happened), so
+        # name it after the process start too in case the pid is reused.
+        self.name = f'{self.pid}-{int(time.time() * 1000)}'
+        self.values = {}
+        self.flushed_at = time.monotonic()
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, tuple(labels.items()))
+        with self.lock:
+            if os.getpid() != self.pid:
+                # Forked (gunicorn preload): start from nothing in the worker.
+                self.reset()
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(buckets) + 1) + [0.0]
+            counts[bisect_left(buckets, value)] += 1
+            counts[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            if os.getpid() != self.pid:
+                self.reset()
+            return [[name, list(labels), list(counts)] for (name, labels), counts in self.values.items()]
+
+    # With several gunicorn workers each one only sees its own requests, so
+    # they write their snapshot to METRICS_DIR every few seconds and /metrics
+    # adds up all the files.
+    def flush(self, directory):
+        path = os.path.join(directory, f'{self.name}.json')
+        data = self.snapshot()
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+        self.flushed_at = time.monotonic()
+
+    def maybe_flush(self, directory, interval):
+        if directory and time.monotonic() - self.flushed_at >= interval:
+            try:
+                self.flush(directory)
+            except OSError as exc:
+                log.warning("Could not write metrics snapshot: %s", exc)
+
+    def collect(self, directory=None):
+        snapshots = [self.snapshot()]
+        if directory:
+            own = os.path.join(directory, f'{self.name}.json')
+            for path in glob.glob(os.path.join(directory, '*.json')):
+                if path == own:
+                    continue
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        merged = {}
+        for snapshot in snapshots:
+            for name, labels, counts in snapshot:
+                if name not in HISTOGRAMS:
+                    continue
+                key = (name, tuple(tuple(pair) for pair in labels))
+                total = merged.get(key)
+                if total is None or len(total) != len(counts):
+                    merged[key] = list(counts)
+                else:
+                    merged[key] = [a + b for a, b in zip(total, counts)]
+        return merged
+
+
+registry = Registry()
+
+
+def clear_dir(directory):
+    # Called by the gunicorn master on start so counts begin at zero.
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        os.remove(path)
+
+
+# ---------- Exposition ----------
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def render(merged):
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (metric, labels), counts in sorted(merged.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f'{name}_bucket{_labels((*labels, ("le", le)))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {counts[-1]:.6f}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+# ---------- Wiring ----------
+class TimingMiddleware:
+    # Outermost layer, so the timing covers session loading and every
+    # before/after_request hook, not just the view.
+    def __init__(self, wsgi_app, profile_rate=0.0):
+        self.wsgi_app = wsgi_app
+        self.profile_rate = profile_rate
+
+    def __call__(self, environ, start_response):
+        environ['ventro.started'] = time.perf_counter()
+        profiler = None
+        if self.profile_rate and random.random() < self.profile_rate:
+            profiler = environ['ventro.profiler'] = cProfile.Profile()
+            profiler.enable()
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            if profiler:
+                profiler.disable()
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _sql_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is None or not has_request_context() or 'metrics_sql' not in g:
+        return
+    elapsed = time.perf_counter() - started
+    g.metrics_sql[0] += 1
+    g.metrics_sql[1] += elapsed
+    registry.observe('ventro_sql_statement_duration_seconds', {'endpoint': _endpoint()}, elapsed)
+
+
+def _template_started(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('metrics_templates', []).append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    if not has_request_context() or not g.get('metrics_templates'):
+        return
+    elapsed = time.perf_counter() - g.metrics_templates.pop()
+    g.metrics_template_seconds = g.get('metrics_template_seconds', 0.0) + elapsed
+    registry.observe('ventro_template_render_seconds', {'template': template.name or 'string'}, elapsed)
+
+
+def _profile_report(profiler):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+    return out.getvalue()
+
+
+def init_app(app):
+    # METRICS_ENABLED: request/SQL/template timing and /metrics. Scraping needs
+    # "Authorization: Bearer <METRICS_TOKEN>"; without a token /metrics is
+    # only served by the debug server and in tests.
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    directory = app.config.get('METRICS_DIR')
+    interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+    slow_ms = app.config.get('SLOW_REQUEST_MS', 500)
+    profile_dir = app.config.get('SLOW_REQUEST_PROFILE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+
+    app.wsgi_app = TimingMiddleware(app.wsgi_app, app.config.get('SLOW_REQUEST_PROFILE_RATE', 0.0))
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _sql_started)
+        event.listen(db.engine, 'after_cursor_execute', _sql_finished)
+    before_render_template.connect(_template_started, app, weak=False)
+    template_rendered.connect(_template_finished, app, weak=False)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_sql = [0, 0.0]
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request_metrics(exc):
+        started = request.environ.get('ventro.started')
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = _endpoint()
+        status = g.get('metrics_status', 500)
+        statements, sql_seconds = g.get('metrics_sql', (0, 0.0))
+        registry.observe('ventro_http_request_duration_seconds',
+                         {'endpoint': endpoint, 'method': request.method, 'status': str(status)}, elapsed)
+        registry.observe('ventro_request_sql_statements', {'endpoint': endpoint}, statements)
+
+        profiler = request.environ.get('ventro.profiler')
+        if profiler:
+            profiler.disable()
+        if elapsed * 1000 >= slow_ms:
+            log.warning(
+                "Slow request: %s %s (%s) %d in %.0f ms; %d SQL statements %.0f ms, templates %.0f ms",
+                request.method, request.full_path.rstrip('?'), endpoint, status, elapsed * 1000,
+                statements, sql_seconds * 1000, g.get('metrics_template_seconds', 0.0) * 1000,
+            )
+            if profiler:
+                log.warning("Profile of %s %s:\n%s", request.method, request.path, _profile_report(profiler))
+                if profile_dir:
+                    profiler.dump_stats(os.path.join(profile_dir, f'{int(time.time() * 1000)}-{endpoint}.prof'))
+        registry.maybe_flush(directory, interval)
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if not token:
+            if not (app.debug or app.testing):
+                return Response('Set METRICS_TOKEN to scrape /metrics\n', 403, mimetype='text/plain')
+        elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Unauthorized\n', 401, mimetype='text/plain')
+        return Response(render(registry.collect(directory)), mimetype='text/plain; version=0.0.4')
@@ -4,6 +4,18 @@ from datetime import datetime
 
 db = SQLAlchemy()
 
+
+def dialect_insert(table):
+    # INSERT that supports .on_conflict_do_update()/_do_nothing() on the
+    # configured database (SQLite and PostgreSQL).
+    from sqlalchemy.dialects import postgresql, sqlite
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    raise RuntimeError(f"Upserts are not supported on {dialect}")
+
 # ----------------- USER MODEL -----------------
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -30,12 +42,113 @@ class Product(db.Model):
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
     category = db.relationship('Category', backref='products')
     is_available = db.Column(db.Boolean, default=True)  # ✅ added field
+    # Units on hand, net of open reservations; NULL means stock isn't tracked.
+    # Only ever changed by the conditional UPDATEs in inventory.py.
+    stock = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped on every change; part of the rendered product card's cache key.
+    # Sales only bump it when the product sells out or comes back.
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # One index per listing order (see facets.SORTS), with and without the
+    # category prefix. Availability and stock are checked while walking these.
+    __table_args__ = (
+        db.Index('ix_product_created_at_id', 'created_at', 'id'),
+        db.Index('ix_product_price_id', 'price', 'id'),
+        db.Index('ix_product_category_created_at', 'category_id', 'created_at', 'id'),
+        db.Index('ix_product_category_price', 'category_id', 'price', 'id'),
+    )
+
+    @property
+    def in_stock(self):
+        # Listed and not sold out; facets.in_stock() is the SQL version.
+        return bool(self.is_available) and (self.stock is None or self.stock > 0)
+
+# ----------------- CATEGORY FACET MODEL -----------------
+# Per-category product counts and price range, recomputed by facets.refresh()
+# from the admin write paths and imports so listings never count on the fly.
+class CategoryFacet(db.Model):
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), primary_key=True)
+    products = db.Column(db.Integer, nullable=False, default=0)
+    available = db.Column(db.Integer, nullable=False, default=0)
+    min_price = db.Column(db.Integer, nullable=True)
+    max_price = db.Column(db.Integer, nullable=True)
 
 # ----------------- ORDER MODEL -----------------
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    stripe_session_id = db.Column(db.String(200), nullable=True)
+    stripe_session_id = db.Column(db.String(200), nullable=True, index=True)
     amount = db.Column(db.Integer, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     status = db.Column(db.String(50), default="pending")
+
+# ----------------- ORDER ITEM MODEL -----------------
+class OrderItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=True, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Integer, nullable=False)
+    order = db.relationship('Order', backref='items')
+
+# ----------------- STOCK RESERVATION MODEL -----------------
+# Units taken from product.stock by a pending order. Deleted when the order is
+# paid (the units are sold) and put back when it fails or expires; see
+# inventory.py.
+class StockReservation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    order = db.relationship('Order', backref='reservations')
+
+# ----------------- ORDER ROLLUP MODELS -----------------
+# Maintained incrementally by analytics.py as orders are placed and change
+# status, so the dashboard never scans the order history.
+class OrderDailyStat(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Integer, nullable=False, default=0)
+
+class CategoryDailyStat(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, primary_key=True)  # 0 = uncategorised
+    status = db.Column(db.String(50), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Integer, nullable=False, default=0)
+
+# ----------------- RANKING MODELS -----------------
+# Product views per UTC day, written in batches by ranking.flush_views().
+class ProductViewStat(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+
+# Precomputed by `python ranking.py` so the home and product pages read their
+# lists with one primary-key range scan joined to product.
+class TrendingProduct(db.Model):
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+class RelatedProduct(db.Model):
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    related_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+
+# ----------------- PAYMENT EVENT MODEL -----------------
+# Webhook events are stored as they arrive (unique on the provider's event id,
+# so retries are no-ops) and applied to orders in batches by payments.py.
+class PaymentEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(255), unique=True, nullable=False)
+    type = db.Column(db.String(100), nullable=False)
+    session_id = db.Column(db.String(200), nullable=True)
+    status = db.Column(db.String(50), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True, index=True)
@@ -0,0 +1,178 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import abort, request, url_for
+from sqlalchemy import and_, or_
+
+DEFAULT_PER_PAGE = 24
+MAX_PER_PAGE = 100
+
+
+# ---------- Page tokens ----------
+# A token is the sort key of the row at the edge of a page, so it stays valid
+# (and points at the same place) no matter how many rows are added elsewhere.
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    # Raises ValueError for anything encode_token() can't have produced, so a
+    # crafted token is a 400 rather than a failed query.
+    if isinstance(value, dict):
+        if set(value) != {'dt'} or not isinstance(value['dt'], str):
+            raise ValueError("bad datetime in page token")
+        return datetime.fromisoformat(value['dt'])
+    if isinstance(value, bool) or not isinstance(value, (str, int, float, type(None))):
+        raise ValueError("page token values must be scalars")
+    if isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63:
+        raise ValueError("page token integer out of range")
+    return value
+
+
+def encode_token(values):
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_token(token, size):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("page token has the wrong length")
+        return [_decode_value(v) for v in values]
+    except (ValueError, TypeError):
+        abort(400)
+
+
+def _check_types(order, values):
+    # A string where the column holds datetimes (or numbers) would fail when
+    # bound, so token values have to match the type of their column.
+    for (column, _), value in zip(order, values):
+        if value is None:
+            continue
+        try:
+            expected = column.type.python_type
+        except (AttributeError, NotImplementedError):
+            continue
+        if expected is datetime:
+            ok = isinstance(value, datetime)
+        elif expected in (int, float):
+            ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+        elif expected is str:
+            ok = isinstance(value, str)
+        else:
+            ok = True
+        if not ok:
+            abort(400)
+    return values
+
+
+# ---------- Request args ----------
+def page_args(prefix='', default=DEFAULT_PER_PAGE, maximum=MAX_PER_PAGE):
+    try:
+        per_page = int(request.args.get(f'{prefix}per_page', default))
+    except ValueError:
+        per_page = default
+    per_page = max(1, min(per_page, maximum))
+    return {
+        'after': request.args.get(f'{prefix}after') or None,
+        'before': request.args.get(f'{prefix}before') or None,
+        'per_page': per_page,
+    }
+
+
+def page_url(**overrides):
+    # URL for the current view with its query string kept, minus any cursor
+    # that the override replaces (`after` and `before` are mutually exclusive).
+    args = dict(request.view_args or {})
+    args.update(request.args.to_dict())
+    for name, value in overrides.items():
+        for cursor in ('after', 'before'):
+            if name.endswith(cursor):
+                prefix = name[:-len(cursor)]
+                args.pop(f'{prefix}after', None)
+                args.pop(f'{prefix}before', None)
+        args[name] = value
+    return url_for(request.endpoint, **args)
+
+
+# ---------- Keyset queries ----------
+class Page:
+    def __init__(self, items, next_token=None, prev_token=None, per_page=DEFAULT_PER_PAGE):
+        self.items = items
+        self.next_token = next_token
+        self.prev_token = prev_token
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_token is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_token is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def to_dict(self, convert=lambda row: row):
+        return {
+            'items': [convert(row) for row in self.items],
+            'next_token': self.next_token,
+            'prev_token': self.prev_token,
+            'per_page': self.per_page,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['items'], data['next_token'], data['prev_token'], data['per_page'])
+
+
+def _seek(order, values, forward):
+    # (a, b) "after" (x, y) in the listing order, expanded so it works for
+    # mixed sort directions and on backends without row-value comparisons.
+    clauses = []
+    for i, ((column, descending), value) in enumerate(zip(order, values)):
+        go_down = descending if forward else not descending
+        cmp = column < value if go_down else column > value
+        equals = [c == v for (c, _), v in zip(order[:i], values[:i])]
+        clauses.append(and_(*equals, cmp))
+    return or_(*clauses)
+
+
+def keyset_page(query, order, per_page, after=None, before=None, key=None):
+    # `order` is a list of (column, descending) pairs ending in a unique column
+    # (usually the primary key) so the ordering is total.
+    key = key or (lambda row: [getattr(row, column.key) for column, _ in order])
+    if before:
+        values = _check_types(order, decode_token(before, len(order)))
+        query = query.filter(_seek(order, values, forward=False))
+        query = query.order_by(*[column.asc() if desc else column.desc() for column, desc in order])
+        rows = query.limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        prev_token = encode_token(key(rows[0])) if has_more and rows else None
+        next_token = encode_token(key(rows[-1])) if rows else None
+        return Page(rows, next_token, prev_token, per_page)
+
+    if after:
+        values = _check_types(order, decode_token(after, len(order)))
+        query = query.filter(_seek(order, values, forward=True))
+    query = query.order_by(*[column.desc() if desc else column.asc() for column, desc in order])
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_token = encode_token(key(rows[-1])) if has_more else None
+    prev_token = encode_token(key(rows[0])) if after and rows else None
+    return Page(rows, next_token, prev_token, per_page)
+
+
+def init_app(app):
+    app.jinja_env.globals['page_url'] = page_url
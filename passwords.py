@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from cache import NullBackend, make_backend
+
+log = logging.getLogger(__name__)
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class HasherBusy(RuntimeError):
+    pass
+
+
+# ---------- Hashing ----------
+class PasswordHasher:
+    # Password hashes are deliberately slow (~150 ms of CPU and 32 MB for
+    # scrypt), so they run on a few dedicated threads instead of the request
+    # thread: a burst of logins queues up behind PASSWORD_HASH_WORKERS instead
+    # of taking every core from catalog traffic, and once PASSWORD_HASH_QUEUE
+    # are waiting, further attempts are turned away (HasherBusy) at once.
+    # hashlib releases the GIL while hashing, so threads are enough.
+    def __init__(self, app=None):
+        self.method = DEFAULT_METHOD
+        self.workers = 1
+        self.queue_size = 8
+        self.timeout = 5.0
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+        # 0 hashes inline on the request thread (no admission control).
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 1)
+        self.queue_size = app.config.get('PASSWORD_HASH_QUEUE', 8)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 5.0)
+        app.extensions['password_hasher'] = self
+
+    def _ensure_started(self):
+        # Threads don't survive fork, so each gunicorn worker starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+                self._pending = 0
+                self._pid = os.getpid()
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        self._ensure_started()
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                raise HasherBusy("password hashing queue is full")
+            self._pending += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HasherBusy("password hashing timed out")
+
+    def needs_rehash(self, stored):
+        return stored.split('$', 1)[0] != self.method
+
+    def _hash(self, password):
+        return generate_password_hash(password, method=self.method)
+
+    def _verify(self, stored, password):
+        if not check_password_hash(stored, password):
+            return False, None
+        # Upgrade hashes made with older parameters while the password is at hand.
+        return True, self._hash(password) if self.needs_rehash(stored) else None
+
+    def hash(self, password):
+        return self._run(self._hash, password)
+
+    def verify(self, stored, password):
+        # Returns (matches, new_hash); new_hash is set when the stored hash
+        # used other parameters than PASSWORD_HASH_METHOD and should be saved.
+        return self._run(self._verify, stored, password)
+
+
+hasher = PasswordHasher()
+
+
+# ---------- Login throttling ----------
+class LoginThrottle:
+    # Fixed-window attempt counters per identity ("user:<name>", "ip:<addr>"),
+    # kept in a cache backend shared by all workers. Checked before any
+    # hashing, so a blocked identity costs one cache read. Read-modify-write
+    # without a lock: concurrent attempts may undercount by a few, which is
+    # fine for a limit of this kind.
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.window = 300
+        self.limits = {'user': 5, 'ip': 30}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backend = make_backend(app, 'LOGIN_THROTTLE', namespace='ventro:login:')
+        self.window = app.config.get('LOGIN_ATTEMPT_WINDOW', 300)
+        self.limits = {
+            'user': app.config.get('LOGIN_MAX_ATTEMPTS', 5),
+            'ip': app.config.get('LOGIN_IP_MAX_ATTEMPTS', 30),
+        }
+        app.extensions['login_throttle'] = self
+
+    def _read(self, key, now):
+        raw = self.backend.get(key)
+        entry = json.loads(raw) if raw else None
+        if not entry or entry['start'] + self.window <= now:
+            return None
+        return entry
+
+    def blocked(self, *keys):
+        # Seconds until the first blocked identity may try again, else 0.
+        now = time.time()
+        for key in keys:
+            entry = self._read(key, now)
+            if entry and entry['count'] >= self.limits[key.split(':', 1)[0]]:
+                return int(entry['start'] + self.window - now) + 1
+        return 0
+
+    def hit(self, *keys):
+        now = time.time()
+        for key in keys:
+            entry = self._read(key, now) or {'start': now, 'count': 0}
+            entry['count'] += 1
+            ttl = max(1, int(entry['start'] + self.window - now) + 1)
+            self.backend.set(key, json.dumps(entry), ttl)
+            if entry['count'] == self.limits[key.split(':', 1)[0]]:
+                log.warning("Login attempts limited for %s for %ss", key, ttl)
+
+    def reset(self, *keys):
+        self.backend.delete(*keys)
+
+
+throttle = LoginThrottle()
+
+
+def identity_keys(username=None, ip=None):
+    keys = []
+    if username:
+        keys.append(f"user:{username.strip().lower()}")
+    if ip:
+        keys.append(f"ip:{ip}")
+    return keys
+
+
+def init_app(app):
+    hasher.init_app(app)
+    throttle.init_app(app)
@@ -0,0 +1,288 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit, urlunsplit
+
+from flask import current_app, redirect, request
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+import analytics
+import inventory
+from models import db, Order, PaymentEvent
+from tasks import task_queue
+
+log = logging.getLogger(__name__)
+
+
+class PaymentError(Exception):
+    pass
+
+
+class WebhookError(PaymentError):
+    pass
+
+
+def checked_event(event):
+    # Both gateways hand back the provider's JSON as is; record_event() needs
+    # a string id and type and, when present, data.object to be an object.
+    if not isinstance(event, dict):
+        raise WebhookError("event is not a JSON object")
+    for field, limit in (('id', 255), ('type', 100)):
+        value = event.get(field)
+        if not isinstance(value, str) or not value or len(value) > limit:
+            raise WebhookError(f"event has no valid {field!r}")
+    data = event.get('data') or {}
+    if not isinstance(data, dict) or not isinstance(data.get('object') or {}, dict):
+        raise WebhookError("event data is not an object")
+    session_id = (data.get('object') or {}).get('id')
+    if session_id is not None and not isinstance(session_id, str):
+        raise WebhookError("event object id is not a string")
+    return event
+
+
+# Stripe only accepts a checkout session expires_at 30 min to 24 h after the
+# session is created, which is a little later than we compute it.
+STRIPE_MIN_SESSION = 30 * 60
+STRIPE_MAX_SESSION = 24 * 3600
+SESSION_EXPIRY_MARGIN = 60
+
+
+def session_expires_at(ttl):
+    # The provider session outlives the stock reservation by a minute so that
+    # rounding and request latency can't push it under Stripe's minimum. The
+    # sweeper waits RESERVATION_GRACE past the reservation, so a late payment
+    # still finds its order pending.
+    seconds = min(max(ttl, STRIPE_MIN_SESSION) + SESSION_EXPIRY_MARGIN, STRIPE_MAX_SESSION)
+    return int(time.time()) + seconds
+
+
+class CheckoutSession:
+    def __init__(self, id, url):
+        self.id = id
+        self.url = url
+
+
+# ---------- Gateways ----------
+class StripeGateway:
+    # Stripe is imported on first use, not at app import. Requests go through
+    # stripe's RequestsClient (a keep-alive requests.Session per thread) with
+    # a short timeout, so a slow provider fails fast instead of pinning a worker.
+    def __init__(self, secret_key, webhook_secret=None, timeout=10, max_retries=1):
+        import stripe
+        self.stripe = stripe
+        self.secret_key = secret_key
+        self.webhook_secret = webhook_secret
+        stripe.default_http_client = stripe.http_client.RequestsClient(timeout=timeout)
+        stripe.max_network_retries = max_retries
+
+    def create_checkout(self, line_items, success_url, cancel_url, expires_at=None):
+        # expires_at (unix time, 30 min to 24 h ahead) ends the session when
+        # the order's stock reservation runs out.
+        try:
+            session = self.stripe.checkout.Session.create(
+                api_key=self.secret_key,
+                payment_method_types=['card'],
+                line_items=line_items,
+                mode='payment',
+                success_url=success_url,
+                cancel_url=cancel_url,
+                **({'expires_at': expires_at} if expires_at else {}),
+            )
+        except self.stripe.error.StripeError as exc:
+            raise PaymentError(str(exc)) from exc
+        return CheckoutSession(session.id, session.url)
+
+    def parse_webhook(self, payload, headers):
+        if not self.webhook_secret:
+            raise WebhookError("STRIPE_WEBHOOK_SECRET is not configured")
+        try:
+            event = self.stripe.Webhook.construct_event(
+                payload, headers.get('Stripe-Signature', ''), self.webhook_secret
+            )
+        except (ValueError, self.stripe.error.SignatureVerificationError) as exc:
+            raise WebhookError(str(exc)) from exc
+        return checked_event(event.to_dict())
+
+
+class StubGateway:
+    # Local stand-in for development and benchmarks: no network. Checkout
+    # "pays" instantly by sending the shopper through /payments/stub/<id>,
+    # which records the same event a Stripe webhook would.
+    def create_checkout(self, line_items, success_url, cancel_url, expires_at=None):
+        session_id = f'cs_stub_{uuid.uuid4().hex}'
+        success = urlsplit(success_url.replace('{CHECKOUT_SESSION_ID}', session_id))
+        next_url = urlunsplit(('', '', success.path, success.query, ''))
+        return CheckoutSession(session_id, f'/payments/stub/{session_id}?' + urlencode({'next': next_url}))
+
+    def parse_webhook(self, payload, headers):
+        try:
+            event = json.loads(payload)
+        except ValueError as exc:
+            raise WebhookError(str(exc)) from exc
+        return checked_event(event)
+
+
+def get_gateway():
+    app = current_app._get_current_object()
+    gateway = app.extensions.get('payment_gateway')
+    if gateway is None:
+        if app.config['PAYMENT_BACKEND'] == 'stripe':
+            gateway = StripeGateway(
+                app.config['STRIPE_SECRET_KEY'],
+                webhook_secret=app.config.get('STRIPE_WEBHOOK_SECRET'),
+                timeout=app.config.get('STRIPE_TIMEOUT', 10),
+                max_retries=app.config.get('STRIPE_MAX_RETRIES', 1),
+            )
+        else:
+            gateway = StubGateway()
+        app.extensions['payment_gateway'] = gateway
+    return gateway
+
+
+# ---------- Webhook events -> order status ----------
+# Only these transitions are applied, so replayed or out-of-order events can
+# never move an order backwards (e.g. "paid" back to "expired").
+ALLOWED_FROM = {
+    'paid': ('pending',),
+    'failed': ('pending',),
+    'expired': ('pending',),
+}
+
+
+def status_for_event(event):
+    obj = (event.get('data') or {}).get('object') or {}
+    kind = event.get('type')
+    if kind == 'checkout.session.completed':
+        return 'paid' if obj.get('payment_status') in ('paid', 'no_payment_required') else None
+    if kind == 'checkout.session.async_payment_succeeded':
+        return 'paid'
+    if kind == 'checkout.session.async_payment_failed':
+        return 'failed'
+    if kind == 'checkout.session.expired':
+        return 'expired'
+    return None
+
+
+def record_event(event):
+    # One small insert on the request thread; duplicates (provider retries)
+    # hit the unique event_id and are ignored. Returns True if it was new.
+    obj = (event.get('data') or {}).get('object') or {}
+    db.session.add(PaymentEvent(
+        event_id=event['id'],
+        type=event.get('type', ''),
+        session_id=obj.get('id'),
+        status=status_for_event(event),
+    ))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    schedule_apply()
+    return True
+
+
+_apply_lock = threading.Lock()
+_apply_scheduled = False
+
+
+def schedule_apply():
+    # Coalesce: while a drain is queued, new events just wait for it, so a
+    # burst of webhooks becomes a few batched UPDATEs instead of one each.
+    global _apply_scheduled
+    with _apply_lock:
+        if _apply_scheduled:
+            return
+        _apply_scheduled = True
+    if not task_queue.submit(_apply_job):
+        with _apply_lock:
+            _apply_scheduled = False
+
+
+def _apply_job():
+    global _apply_scheduled
+    with _apply_lock:
+        _apply_scheduled = False
+    apply_pending_events()
+
+
+def apply_pending_events(batch_size=500):
+    applied = 0
+    while True:
+        events = (
+            PaymentEvent.query.filter(PaymentEvent.processed_at.is_(None))
+            .order_by(PaymentEvent.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not events:
+            return applied
+        sessions = defaultdict(set)
+        back = []
+        for e in events:
+            if e.status in ALLOWED_FROM and e.session_id:
+                sessions[e.status].add(e.session_id)
+        # "paid" first: if a batch holds both paid and expired for a session,
+        # the payment wins.
+        # RETURNING hands back exactly the orders that moved, so the rollups
+        # and stock reservations change in the same transaction and a
+        # concurrent drain (or the reservation sweeper) can't apply them twice.
+        for status in sorted(sessions, key=lambda s: s != 'paid'):
+            for previous in ALLOWED_FROM[status]:
+                moved = db.session.execute(
+                    update(Order)
+                    .where(Order.stripe_session_id.in_(sessions[status]), Order.status == previous)
+                    .values(status=status)
+                    .returning(Order.id, Order.created_at, Order.amount)
+                    .execution_options(synchronize_session=False)
+                ).all()
+                analytics.record_status_change(moved, previous, status)
+                back += inventory.settle([row.id for row in moved], status)
+        db.session.execute(
+            update(PaymentEvent)
+            .where(PaymentEvent.id.in_([e.id for e in events]), PaymentEvent.processed_at.is_(None))
+            .values(processed_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        inventory.invalidate(back)
+        applied += len(events)
+
+
+def init_app(app):
+    # PAYMENT_BACKEND: "stripe" (default) or "stub". The stub accepts unsigned
+    # webhooks and fakes payment, so it must be opted into explicitly.
+    backend = app.config.setdefault('PAYMENT_BACKEND', 'stripe')
+    ttl = app.config.get('RESERVATION_TTL', 1800)
+    if backend == 'stripe' and not STRIPE_MIN_SESSION <= ttl <= STRIPE_MAX_SESSION:
+        raise ValueError(f"RESERVATION_TTL must be between {STRIPE_MIN_SESSION} and {STRIPE_MAX_SESSION} "
+                         f"seconds (Stripe's checkout session lifetime), got {ttl}")
+    if app.config.get('RESERVATION_GRACE', 300) < SESSION_EXPIRY_MARGIN:
+        raise ValueError(f"RESERVATION_GRACE must be at least {SESSION_EXPIRY_MARGIN} seconds")
+
+    @app.route('/webhooks/stripe', methods=['POST'])
+    def payment_webhook():
+        try:
+            event = get_gateway().parse_webhook(request.get_data(), request.headers)
+        except WebhookError as exc:
+            log.warning("Rejected payment webhook: %s", exc)
+            return {'error': 'invalid payload'}, 400
+        record_event(event)
+        return {'received': True}
+
+    if backend == 'stub':
+        @app.route('/payments/stub/<session_id>')
+        def payment_stub(session_id):
+            record_event({
+                'id': f'evt_stub_{session_id}',
+                'type': 'checkout.session.completed',
+                'data': {'object': {'id': session_id, 'payment_status': 'paid'}},
+            })
+            target = request.args.get('next', '/')
+            # Only ever redirect back into this app.
+            return redirect(target if target.startswith('/') and not target.startswith('//') else '/')
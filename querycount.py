@@ -0,0 +1,61 @@
+import logging
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+from models import db
+
+log = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+# ---------- Budgets ----------
+def query_budget(limit):
+    # Maximum number of SQL statements a view may issue with a cold cache.
+    # Put it directly under @app.route (above @login_required, if any).
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def queries_this_request():
+    return g.get('sql_queries', 0)
+
+
+# ---------- Wiring ----------
+def _count(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and 'sql_queries' in g:
+        g.sql_queries += 1
+
+
+def init_app(app):
+    # SQL_QUERY_GUARD: "raise" fails the request (use in tests), "warn" logs,
+    # False disables counting altogether.
+    app.config.setdefault('SQL_QUERY_GUARD', 'raise' if app.testing else 'warn' if app.debug else False)
+    app.config.setdefault('SQL_QUERY_BUDGET', 20)
+    if not app.config['SQL_QUERY_GUARD']:
+        return
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _count)
+
+    @app.before_request
+    def start_counting():
+        g.sql_queries = 0
+
+    @app.after_request
+    def check_budget(response):
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', app.config['SQL_QUERY_BUDGET'])
+        count = queries_this_request()
+        response.headers['X-SQL-Queries'] = str(count)
+        if count > budget:
+            message = f"{request.endpoint} issued {count} SQL statements (budget {budget})"
+            if app.config['SQL_QUERY_GUARD'] == 'raise':
+                raise QueryBudgetExceeded(message)
+            log.warning(message)
+        return response
@@ -0,0 +1,255 @@
+import bisect
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import Date, delete, func, insert, select
+from sqlalchemy.orm import aliased
+
+from facets import in_stock
+from models import db, dialect_insert, Order, OrderItem, Product, ProductViewStat, RelatedProduct, TrendingProduct
+from tasks import task_queue
+
+# Trending and related products, computed offline (`python ranking.py`, e.g.
+# hourly from cron) into two small lookup tables:
+#
+#   trending_product  (rank) -> product_id, score
+#   related_product   (product_id, rank) -> related_id
+#
+# Trending scores add up units ordered and product views per day over the last
+# TRENDING_DAYS, each day's share halving every TRENDING_HALF_LIFE_DAYS.
+# Related lists are the products most often bought in the same orders, topped
+# up with the nearest in price from the same category. Only products in stock
+# are ranked. Pages read these with one indexed query (see catalog.py) and
+# never aggregate orders or views themselves.
+
+COUNTED_STATUSES = ('pending', 'paid')
+WRITE_BATCH = 1000
+
+
+# ---------- View counts ----------
+# Views are counted in memory per process and added to product_view_stat on
+# the task queue every VIEW_FLUSH_INTERVAL seconds, so a product page costs a
+# dict update rather than a write. Counts not yet flushed when a worker is
+# killed are lost; gunicorn.conf.py flushes them on a normal exit.
+_views = Counter()
+_views_lock = threading.Lock()
+_last_flush = None
+
+
+def record_view(product_id):
+    global _last_flush
+    now = time.monotonic()
+    with _views_lock:
+        _views[product_id] += 1
+        if _last_flush is None:
+            _last_flush = now
+        if now - _last_flush < current_app.config.get('VIEW_FLUSH_INTERVAL', 30):
+            return
+        _last_flush = now
+    task_queue.submit(flush_views)
+
+
+def flush_views():
+    with _views_lock:
+        counts = dict(_views)
+        _views.clear()
+    if not counts:
+        return 0
+    table = ProductViewStat.__table__
+    stmt = dialect_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['day', 'product_id'],
+        set_={'views': table.c.views + stmt.excluded.views},
+    )
+    day = datetime.utcnow().date()
+    try:
+        db.session.execute(stmt, [{'day': day, 'product_id': pid, 'views': n} for pid, n in counts.items()])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        # Keep them for the next flush.
+        with _views_lock:
+            _views.update(counts)
+        raise
+    return sum(counts.values())
+
+
+# ---------- Trending ----------
+def _available(product_ids):
+    return set(db.session.scalars(
+        select(Product.id).where(Product.id.in_(product_ids), in_stock())
+    ))
+
+
+def trending_scores(now, days, half_life, view_weight):
+    # {product_id: score}. Both inputs are grouped per product and day in SQL,
+    # so Python only sees one row per product per day with any activity.
+    today = now.date()
+    since = today - timedelta(days=days - 1)
+    scores = defaultdict(float)
+
+    def add(product_id, day, amount):
+        scores[product_id] += amount * 0.5 ** ((today - day).days / half_life)
+
+    day = func.date(Order.created_at, type_=Date)
+    for product_id, order_day, units in db.session.execute(
+        select(OrderItem.product_id, day, func.sum(OrderItem.quantity))
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(
+            Order.created_at >= datetime.combine(since, datetime.min.time()),
+            Order.status.in_(COUNTED_STATUSES),
+            OrderItem.product_id.is_not(None),
+        )
+        .group_by(OrderItem.product_id, day)
+    ):
+        add(product_id, order_day, units)
+    if view_weight:
+        for product_id, view_day, views in db.session.execute(
+            select(ProductViewStat.product_id, ProductViewStat.day, ProductViewStat.views)
+            .where(ProductViewStat.day >= since)
+        ):
+            add(product_id, view_day, views * view_weight)
+    return scores
+
+
+def rebuild_trending(now=None):
+    config = current_app.config
+    now = now or datetime.utcnow()
+    limit = config.get('TRENDING_LIMIT', 8)
+    scores = trending_scores(
+        now, config.get('TRENDING_DAYS', 14), config.get('TRENDING_HALF_LIFE_DAYS', 3),
+        config.get('TRENDING_VIEW_WEIGHT', 0.05),
+    )
+    ranked = sorted(scores, key=lambda pid: (-scores[pid], pid))
+    top = []
+    # Walk down the ranking in chunks until enough of them are still on sale.
+    for start in range(0, len(ranked), limit * 4):
+        chunk = ranked[start:start + limit * 4]
+        available = _available(chunk)
+        top += [pid for pid in chunk if pid in available][:limit - len(top)]
+        if len(top) == limit:
+            break
+    db.session.execute(delete(TrendingProduct))
+    if top:
+        db.session.execute(insert(TrendingProduct), [
+            {'rank': rank, 'product_id': pid, 'score': round(scores[pid], 4), 'computed_at': now}
+            for rank, pid in enumerate(top)
+        ])
+    db.session.commit()
+    return len(top)
+
+
+# ---------- Related ----------
+def _bought_together(since):
+    # {product_id: [(orders, other_id), ...]} over orders placed since `since`.
+    # One self-join of order_item per order, grouped in SQL.
+    mine, other = aliased(OrderItem), aliased(OrderItem)
+    pairs = defaultdict(list)
+    for product_id, other_id, orders in db.session.execute(
+        select(mine.product_id, other.product_id, func.count(func.distinct(mine.order_id)))
+        .join(other, (other.order_id == mine.order_id) & (other.product_id != mine.product_id))
+        .join(Order, Order.id == mine.order_id)
+        .where(Order.created_at >= since, Order.status.in_(COUNTED_STATUSES), mine.product_id.is_not(None))
+        .group_by(mine.product_id, other.product_id)
+    ):
+        pairs[product_id].append((orders, other_id))
+    return pairs
+
+
+def _nearest_in_price(prices, ids, price, exclude, count):
+    # prices / ids: one category's available products sorted by price. Walks
+    # outwards from `price`, taking whichever neighbour is closer.
+    picked = []
+    hi = bisect.bisect_left(prices, price)
+    lo = hi - 1
+    while len(picked) < count and (lo >= 0 or hi < len(prices)):
+        if hi >= len(prices) or (lo >= 0 and price - prices[lo] <= prices[hi] - price):
+            candidate = ids[lo]
+            lo -= 1
+        else:
+            candidate = ids[hi]
+            hi += 1
+        if candidate not in exclude:
+            picked.append(candidate)
+    return picked
+
+
+def related_lists(now, limit, days):
+    # {product_id: [related_id, ...]} for every product, including ones not on
+    # sale (their pages still render), pointing only at available ones.
+    products = [tuple(row) for row in db.session.execute(
+        select(Product.id, Product.category_id, Product.price, in_stock()).order_by(Product.price, Product.id)
+    )]
+    available = {pid for pid, _, _, on_sale in products if on_sale}
+    ladders = defaultdict(lambda: ([], []))
+    for pid, category_id, price, on_sale in products:
+        if on_sale and category_id is not None:
+            ladders[category_id][0].append(price)
+            ladders[category_id][1].append(pid)
+    pairs = _bought_together(now - timedelta(days=days))
+
+    lists = {}
+    for pid, category_id, price, _ in products:
+        chosen = []
+        if pid in pairs:
+            bought = sorted((-orders, other) for orders, other in pairs[pid] if other in available)
+            chosen = [other for _, other in bought[:limit]]
+        if len(chosen) < limit and category_id in ladders:
+            prices, ids = ladders[category_id]
+            chosen += _nearest_in_price(prices, ids, price, {pid, *chosen}, limit - len(chosen))
+        lists[pid] = chosen
+    return lists
+
+
+def rebuild_related(now=None):
+    # Only products whose list changed are rewritten, WRITE_BATCH products per
+    # transaction, so a run holds the write lock for short stretches and a
+    # page never sees a half-written list. Returns the number rewritten.
+    config = current_app.config
+    now = now or datetime.utcnow()
+    lists = related_lists(now, config.get('RELATED_LIMIT', 4), config.get('RELATED_ORDER_DAYS', 180))
+    current = defaultdict(list)
+    for product_id, related_id in db.session.execute(
+        select(RelatedProduct.product_id, RelatedProduct.related_id).order_by(RelatedProduct.product_id, RelatedProduct.rank)
+    ):
+        current[product_id].append(related_id)
+    db.session.rollback()
+
+    changed = sorted(pid for pid in lists.keys() | current.keys() if lists.get(pid, []) != current.get(pid, []))
+    for start in range(0, len(changed), WRITE_BATCH):
+        batch = changed[start:start + WRITE_BATCH]
+        db.session.execute(delete(RelatedProduct).where(RelatedProduct.product_id.in_(batch)))
+        rows = [
+            {'product_id': pid, 'rank': rank, 'related_id': related_id}
+            for pid in batch for rank, related_id in enumerate(lists.get(pid, ()))
+        ]
+        if rows:
+            db.session.execute(insert(RelatedProduct), rows)
+        db.session.commit()
+    return len(changed)
+
+
+# ---------- Job ----------
+def rebuild():
+    now = datetime.utcnow()
+    days = current_app.config.get('TRENDING_DAYS', 14)
+    db.session.execute(delete(ProductViewStat).where(ProductViewStat.day < now.date() - timedelta(days=days)))
+    db.session.commit()
+    return {'trending': rebuild_trending(now), 'related': rebuild_related(now)}
+
+
+def main():
+    from app import create_app
+    app = create_app()
+    started = time.perf_counter()
+    with app.app_context():
+        result = rebuild()
+    print(f"✅ Rankings rebuilt in {time.perf_counter() - started:.1f}s: {result['trending']} trending, "
+          f"related lists updated for {result['related']} products")
+
+
+if __name__ == '__main__':
+    main()
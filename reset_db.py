@@ -1,8 +1,8 @@
 from app import create_app
-from models import db
+from bootstrap import upgrade
 
 app = create_app()
 
 with app.app_context():
-    db.create_all()
+    upgrade()
     print("✅ New ventro.db created with all tables!")
@@ -3,4 +3,8 @@ from app import create_app
 app = create_app()
 
 if __name__ == "__main__":
+    # The development server brings the local database up to date first;
+    # deployments run `python bootstrap.py` as their release step.
+    import bootstrap
+    bootstrap.main(app)
     app.run(debug=True, port=5000)
@@ -0,0 +1,206 @@
+import re
+
+from sqlalchemy import and_, func, literal_column, or_, table, text
+from sqlalchemy.orm import joinedload
+
+import facets
+from catalog import PRODUCT_ORDER, product_query
+from models import db, Category, Product
+from pagination import Page, keyset_page
+
+# Column weights for bm25(): a hit in the title counts most, then the
+# category name, then the description.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 2.0
+CATEGORY_WEIGHT = 5.0
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# ---------- SQLite FTS5 index ----------
+# product_fts holds its own copy of title/description/category name keyed by
+# product id. Triggers keep it in sync with every write path (ORM, bulk
+# statements, raw SQL), so nothing in the app has to remember to reindex.
+_FTS_DDL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+    title, description, category,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+_INDEX_ROW = """
+    INSERT INTO product_fts (rowid, title, description, category)
+    VALUES (new.id, new.title, coalesce(new.description, ''),
+            coalesce((SELECT name FROM category WHERE id = new.category_id), ''));
+"""
+
+_TRIGGERS = {
+    'product_fts_ai': f"""
+        CREATE TRIGGER product_fts_ai AFTER INSERT ON product BEGIN
+            {_INDEX_ROW}
+        END
+    """,
+    'product_fts_au': f"""
+        CREATE TRIGGER product_fts_au AFTER UPDATE OF title, description, category_id ON product BEGIN
+            DELETE FROM product_fts WHERE rowid = old.id;
+            {_INDEX_ROW}
+        END
+    """,
+    'product_fts_ad': """
+        CREATE TRIGGER product_fts_ad AFTER DELETE ON product BEGIN
+            DELETE FROM product_fts WHERE rowid = old.id;
+        END
+    """,
+    'product_fts_cu': """
+        CREATE TRIGGER product_fts_cu AFTER UPDATE OF name ON category BEGIN
+            UPDATE product_fts SET category = new.name
+            WHERE rowid IN (SELECT id FROM product WHERE category_id = new.id);
+        END
+    """,
+}
+
+
+def uses_fts():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def ensure_index():
+    # Idempotent. Rebuilds from the product table whenever the index or one of
+    # its triggers was missing (first run, or after db.drop_all()).
+    if not uses_fts():
+        return False
+    with db.engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(
+                text("SELECT name FROM sqlite_master WHERE name IN ('product_fts', :a, :b, :c, :d)"),
+                dict(zip('abcd', _TRIGGERS)),
+            )
+        }
+        conn.execute(text(_FTS_DDL))
+        for name, ddl in _TRIGGERS.items():
+            if name not in existing:
+                conn.execute(text(ddl))
+        if existing < {'product_fts', *_TRIGGERS}:
+            _rebuild(conn)
+    return True
+
+
+def rebuild_index():
+    if not uses_fts():
+        return
+    with db.engine.begin() as conn:
+        _rebuild(conn)
+
+
+def _rebuild(conn):
+    conn.execute(text("DELETE FROM product_fts"))
+    conn.execute(text(
+        "INSERT INTO product_fts (rowid, title, description, category) "
+        "SELECT p.id, p.title, coalesce(p.description, ''), coalesce(c.name, '') "
+        "FROM product p LEFT JOIN category c ON c.id = p.category_id"
+    ))
+
+
+# ---------- Queries ----------
+def search_terms(query):
+    return _TERM_RE.findall(query.lower())[:10]
+
+
+def match_expression(terms, column=None):
+    # Every term must match, each as a prefix ("hood" finds "hoodie"), in any
+    # column or only in `column`. Terms are quoted so user input can never be
+    # parsed as FTS5 query syntax.
+    scope = f'{column} : ' if column else ''
+    return ' '.join(f'{scope}"{term}"*' for term in terms)
+
+
+# Search adds "relevance" (bm25 rank) to the catalog sorts and makes it the
+# default.
+SORTS = {'relevance': None, **facets.SORTS}
+DEFAULT_SORT = 'relevance'
+
+
+def search_products(query, per_page, after=None, before=None, filters=None, category_id=None):
+    # filters: see facets.filter_args(); category_id narrows to one category.
+    terms = search_terms(query)
+    if not terms:
+        return Page([], per_page=per_page)
+    filters = filters or {'min_price': None, 'max_price': None, 'available': False, 'sort': DEFAULT_SORT}
+    if uses_fts():
+        return _search_fts(terms, per_page, after, before, filters, category_id)
+    return _search_like(terms, per_page, after, before, filters, category_id)
+
+
+def search_facets(query, filters=None):
+    # {category_id: number of matches} with the price/availability filters
+    # applied: one GROUP BY over the matches (search facets depend on the
+    # query, so unlike category facets they can't be precomputed).
+    terms = search_terms(query)
+    if not terms:
+        return {}
+    if uses_fts():
+        hits = _fts_hits(terms)
+        counts = db.session.query(Product.category_id, func.count(Product.id)).join(hits, Product.id == hits.c.id)
+    else:
+        counts = _like_query(db.session.query(Product.category_id, func.count(Product.id)), terms)
+    if filters:
+        counts = facets.apply_filters(counts, filters)
+    return dict(counts.group_by(Product.category_id).all())
+
+
+def _fts_hits(terms, column=None):
+    fts = table('product_fts')
+    return (
+        db.session.query(
+            literal_column('product_fts.rowid').label('id'),
+            func.bm25(literal_column('product_fts'), TITLE_WEIGHT, DESCRIPTION_WEIGHT, CATEGORY_WEIGHT).label('rank'),
+        )
+        .select_from(fts)
+        .filter(literal_column('product_fts').op('MATCH')(match_expression(terms, column)))
+        .subquery()
+    )
+
+
+def _search_fts(terms, per_page, after, before, filters, category_id):
+    hits = _fts_hits(terms)
+    query = (
+        db.session.query(Product, hits.c.rank)
+        .join(hits, Product.id == hits.c.id)
+        .options(joinedload(Product.category))
+    )
+    query = facets.apply_filters(query, filters)
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    order = SORTS.get(filters['sort'])
+    if order is None:
+        order = [(hits.c.rank, False), (hits.c.id, False)]
+        key = lambda row: [row.rank, row.Product.id]
+    else:
+        key = lambda row: [getattr(row.Product, column.key) for column, _ in order]
+    page = keyset_page(query, order, per_page, after=after, before=before, key=key)
+    page.items = [row.Product for row in page.items]
+    return page
+
+
+def _like_query(query, terms):
+    # Fallback for server databases: every term has to appear in the title,
+    # description or category name.
+    query = query.outerjoin(Category, Product.category_id == Category.id)
+    clauses = []
+    for term in terms:
+        pattern = f'%{term}%'
+        clauses.append(or_(
+            Product.title.ilike(pattern),
+            Product.description.ilike(pattern),
+            Category.name.ilike(pattern),
+        ))
+    return query.filter(and_(*clauses))
+
+
+def _search_like(terms, per_page, after, before, filters, category_id):
+    # No ranking here, so "relevance" means newest first like the other listings.
+    query = facets.apply_filters(_like_query(product_query(), terms), filters)
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    order = SORTS.get(filters['sort']) or PRODUCT_ORDER
+    return keyset_page(query, order, per_page, after=after, before=before)
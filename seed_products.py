@@ -1,7 +1,9 @@
 from app import create_app
 from dotenv import load_dotenv
-from models import db, Category, Product, User
+from models import db, Category, User
 from werkzeug.security import generate_password_hash
+from import_catalog import import_rows
+from bootstrap import upgrade
 import os
 
 # Load environment variables
@@ -12,17 +14,16 @@ app = create_app()
 
 # ✅ Everything below stays inside the app context
 with app.app_context():
-    # Drop and recreate tables
-    db.drop_all()
-    db.create_all()
-    print("✅ Tables recreated successfully!")
+    # Seeding is an upsert on slug, so it can be re-run without dropping
+    # anything (use init_db.py for a full reset).
+    upgrade()
 
     # Create admin user
     if not User.query.filter_by(username='admin').first():
         admin = User(
             username='admin',
             email='admin@example.com',
-            password_hash=generate_password_hash('admin123'),
+            password_hash=generate_password_hash('admin123', method=app.config['PASSWORD_HASH_METHOD']),
             is_admin=True
         )
         db.session.add(admin)
@@ -47,14 +48,9 @@ with app.app_context():
         Category(name='Automotive', slug='automotive')
     ]
 
-    for c in categories:
-        if not Category.query.filter_by(slug=c.slug).first():
-            db.session.add(c)
-    db.session.commit()
-    print("📂 Categories added successfully!")
-
-    # Retrieve category references
-    cat = {c.slug: Category.query.filter_by(slug=c.slug).first() for c in categories}
+    # Category objects are only used for their name/slug; import_rows()
+    # upserts them together with the products.
+    cat = {c.slug: c for c in categories}
 
     # ✅ Products are also added *inside* app context
     products = [
@@ -118,17 +114,8 @@ with app.app_context():
         {"title": "Car Phone Mount", "slug": "car-phone-mount", "price": 499, "description": "Magnetic dashboard phone holder.", "image": "images/products/product35.jpg", "category": cat['automotive']}
     ]
 
-    for p in products:
-        if not Product.query.filter_by(slug=p['slug']).first():
-            product = Product(
-                title=p['title'],
-                slug=p['slug'],
-                price=p['price'],
-                description=p['description'],
-                image=p['image'],
-                category=p['category']
-            )
-            db.session.add(product)
-
-    db.session.commit()
-    print("🎉 Database seeded with all categories and products successfully!")
+    stats = import_rows(
+        {**p, 'category_slug': p['category'].slug, 'category': p['category'].name}
+        for p in products
+    )
+    print(f"🎉 Database seeded with {stats['rows']} products successfully!")
@@ -0,0 +1,188 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.sessions import SecureCookieSession, SessionInterface, session_json_serializer
+from flask_login import user_logged_in
+from itsdangerous import BadSignature, Signer
+
+from cache import MemoryBackend
+
+
+# ---------- Backends ----------
+# Both backends store the serialized session under an opaque session id and
+# expose get / set(sid, raw, ttl) / delete, like the catalog cache backends.
+class SQLiteSessionBackend:
+    CLEANUP_BATCH = 500
+
+    def __init__(self, path, cleanup_interval=300):
+        self.path = path
+        self.cleanup_interval = cleanup_interval
+        self._local = threading.local()
+        self._cleaner_pid = None
+        self._cleaner_lock = threading.Lock()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS session_data ("
+            " sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS ix_session_data_expires ON session_data (expires_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, sid):
+        row = self._conn().execute(
+            "SELECT data FROM session_data WHERE sid = ? AND expires_at >= ?", (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, sid, raw, ttl):
+        self._ensure_cleaner()
+        self._conn().execute(
+            "INSERT INTO session_data (sid, data, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(sid) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+            (sid, raw, time.time() + ttl),
+        )
+
+    def delete(self, *sids):
+        self._conn().executemany("DELETE FROM session_data WHERE sid = ?", [(s,) for s in sids])
+
+    def purge_expired(self):
+        # Small batches keep each write transaction (and its lock) short.
+        removed = 0
+        while True:
+            cur = self._conn().execute(
+                "DELETE FROM session_data WHERE sid IN ("
+                " SELECT sid FROM session_data WHERE expires_at < ? LIMIT ?)",
+                (time.time(), self.CLEANUP_BATCH),
+            )
+            removed += cur.rowcount
+            if cur.rowcount < self.CLEANUP_BATCH:
+                return removed
+
+    def _ensure_cleaner(self):
+        # Started lazily so each forked worker gets its own thread.
+        if self._cleaner_pid == os.getpid():
+            return
+        with self._cleaner_lock:
+            if self._cleaner_pid == os.getpid():
+                return
+            self._cleaner_pid = os.getpid()
+            threading.Thread(target=self._cleanup_loop, name='session-cleanup', daemon=True).start()
+
+    def _cleanup_loop(self):
+        while True:
+            time.sleep(self.cleanup_interval)
+            try:
+                self.purge_expired()
+            except sqlite3.Error:
+                pass
+
+
+# ---------- Session interface ----------
+class ServerSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None, new=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+        self.rotate = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+    # The cookie carries only a signed session id, so its size and signing
+    # cost stay the same however big the cart grows.
+    serializer = session_json_serializer
+    salt = 'ventro-session-id'
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('ascii')
+            except BadSignature:
+                sid = None
+            if sid:
+                raw = self.backend.get(sid)
+                if raw is not None:
+                    return ServerSession(self.serializer.loads(raw), sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.rotate:
+            # New id after login so a planted session id can't be reused.
+            if not session.new:
+                self.backend.delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            session.new = True
+
+        if session.modified or session.new:
+            self.backend.set(session.sid, self.serializer.dumps(dict(session)), self.ttl)
+
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode('ascii'),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def _rotate_on_login(sender, user, **extra):
+    from flask import session
+    if isinstance(session, ServerSession):
+        session.rotate = True
+
+
+def init_app(app):
+    # SESSION_BACKEND: "sqlite" (shared by all workers), "memory" (LRU, per
+    # process) or "cookie" (Flask's default signed-cookie sessions).
+    kind = app.config.get('SESSION_BACKEND', 'sqlite')
+    ttl = app.config.get('SESSION_TTL', 7 * 24 * 3600)
+    if kind == 'cookie':
+        return
+    if kind == 'memory':
+        backend = MemoryBackend(max_entries=app.config.get('SESSION_MAX_ENTRIES', 10000))
+    elif kind == 'sqlite':
+        backend = SQLiteSessionBackend(
+            app.config['SESSION_DB_PATH'],
+            cleanup_interval=app.config.get('SESSION_CLEANUP_INTERVAL', 300),
+        )
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {kind!r}")
+    app.session_interface = ServerSideSessionInterface(backend, ttl)
+    user_logged_in.connect(_rotate_on_login, app)
@@ -0,0 +1,70 @@
+import logging
+import os
+import queue
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class TaskQueue:
+    # Small in-process job queue for work that shouldn't hold a request:
+    # a bounded queue drained by daemon threads that run each job inside an
+    # app context. Threads start on first use in each process, so the queue
+    # is safe to create before gunicorn forks its workers.
+    def __init__(self, app=None):
+        self.app = None
+        self.workers = 2
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('TASK_WORKERS', 2)
+        self.maxsize = app.config.get('TASK_QUEUE_SIZE', 1000)
+        app.extensions['task_queue'] = self
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.maxsize)
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f'task-worker-{i}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, fn, *args, **kwargs):
+        # Returns False instead of blocking when the queue is full; callers
+        # decide whether to drop the job or do it inline.
+        if self.app is None:
+            raise RuntimeError("TaskQueue.init_app() was not called")
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((fn, args, kwargs))
+        except queue.Full:
+            log.warning("Task queue full, dropping %s", getattr(fn, '__name__', fn))
+            return False
+        return True
+
+    def join(self):
+        # Wait for every queued job to finish (tests, benchmarks, shutdown).
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            fn, args, kwargs = self._queue.get()
+            try:
+                with self.app.app_context():
+                    fn(*args, **kwargs)
+            except Exception:
+                log.exception("Background task %s failed", getattr(fn, '__name__', fn))
+            finally:
+                self._queue.task_done()
+
+
+task_queue = TaskQueue()
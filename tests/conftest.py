@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from app import create_app
+from cache import catalog_cache
+
+# A small seeded catalog in a scratch SQLite database, with every cache and
+# session store in memory, so tests never touch instance/. TESTING turns the
+# query budget guard (querycount.py) to "raise".
+
+CATEGORIES = ['Clothing', 'Electronics', 'Home & Kitchen']
+PRODUCTS = 30
+ADMIN_PASSWORD = 'admin-password'
+
+
+def catalog_rows():
+    for i in range(PRODUCTS):
+        yield {
+            'title': f"Test Widget {i}",
+            'slug': f'test-widget-{i}',
+            'description': f"Widget number {i}",
+            'price': 100 + i * 10,
+            'image': f'images/products/product{i % 35 + 1}.jpg',
+            'category': CATEGORIES[i % len(CATEGORIES)],
+        }
+
+
+@pytest.fixture(scope='session')
+def database_uri(tmp_path_factory):
+    from bootstrap import upgrade
+    from import_catalog import import_rows
+    from models import db, User
+
+    workdir = tmp_path_factory.mktemp('ventro')
+    uri = f"sqlite:///{workdir / 'test.db'}"
+    app = make_app(uri)
+    with app.app_context():
+        upgrade()
+        import_rows(catalog_rows())
+        import passwords
+        db.session.add(User(username='admin', email='admin@example.com', is_admin=True,
+                            password_hash=passwords.hasher.hash(ADMIN_PASSWORD)))
+        db.session.commit()
+    return uri
+
+
+def make_app(uri, **overrides):
+    return create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'CATALOG_CACHE_BACKEND': 'memory',
+        'FRAGMENT_CACHE_BACKEND': 'memory',
+        'SESSION_BACKEND': 'memory',
+        'LOGIN_THROTTLE_BACKEND': 'memory',
+        'PAYMENT_BACKEND': 'stub',
+        'METRICS_ENABLED': False,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PASSWORD_HASH_WORKERS': 0,
+        **overrides,
+    })
+
+
+@pytest.fixture
+def app(database_uri):
+    return make_app(database_uri)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def cold(app):
+    # Call before a request to measure it with nothing cached.
+    def clear():
+        catalog_cache.clear()
+        app.jinja_env.fragment_cache.clear()
+    return clear
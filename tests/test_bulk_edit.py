@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from conftest import ADMIN_PASSWORD
+
+# The JSON bulk edit API answers 400 for a body of the wrong shape instead of
+# guessing: a string of ids is not a list of ids, and "false" is not true.
+
+
+@pytest.fixture
+def admin(client):
+    r = client.post('/admin/login', data={'username': 'admin', 'password': ADMIN_PASSWORD})
+    assert r.status_code == 302
+    return client
+
+
+def bulk_edit(client, body):
+    return client.post('/admin/products/bulk', data=json.dumps(body), content_type='application/json')
+
+
+@pytest.mark.parametrize('body', [
+    [1, 2],
+    {'ids': '123', 'set': {'is_available': True}},
+    {'ids': 5, 'set': {'is_available': True}},
+    {'ids': [1, '2'], 'set': {'is_available': True}},
+    {'ids': [True], 'set': {'is_available': True}},
+    {'filter': 'clothing', 'set': {'is_available': True}},
+    {'filter': {'q': ['widget']}, 'set': {'is_available': True}},
+    {'filter': {'all': 'nope'}, 'set': {'is_available': True}},
+    {'ids': [1], 'set': ['is_available']},
+    {'ids': [1], 'set': {'category': {'slug': 'x'}}},
+    {'ids': [1], 'set': {'is_available': True}, 'dry_run': 'maybe'},
+])
+def test_malformed_body_is_rejected(admin, body):
+    r = bulk_edit(admin, body)
+    assert r.status_code == 400
+    assert r.get_json()['error']
+
+
+@pytest.mark.parametrize('dry_run, updated', [('true', 0), ('false', 1), (False, 1), (None, 1)])
+def test_dry_run_flag(admin, dry_run, updated):
+    r = bulk_edit(admin, {'ids': [1], 'set': {'is_available': True}, 'dry_run': dry_run})
+    assert r.status_code == 200
+    assert r.get_json()['matched'] == 1
+    assert r.get_json()['updated'] == updated
+    assert r.get_json()['dry_run'] is (updated == 0)
+
+
+def test_matching_count_is_capped(app):
+    import bulk
+    with app.app_context():
+        assert bulk.count_matching([], limit=5) == (5, True)
+        assert bulk.count_matching([], limit=1000) == (30, False)
@@ -0,0 +1,21 @@
+import pytest
+
+import catalog
+from cache import catalog_cache
+
+# The catalog version behind ETag / Last-Modified is kept until the next write
+# in a shared cache, but only for CATALOG_CACHE_TTL in a per-process one,
+# which never hears about other workers' writes.
+
+
+@pytest.mark.parametrize('backend, lifetime', [('memory', 300), ('sqlite', catalog.VERSION_TTL)])
+def test_version_lifetime(database_uri, tmp_path, backend, lifetime):
+    from conftest import make_app
+    app = make_app(database_uri, CATALOG_CACHE_BACKEND=backend, CATALOG_CACHE_TTL=300,
+                   CATALOG_CACHE_PATH=str(tmp_path / 'catalog_cache.db'))
+    stored = {}
+    set_raw = catalog_cache.backend.set
+    catalog_cache.backend.set = lambda key, raw, ttl: stored.update({key: ttl}) or set_raw(key, raw, ttl)
+    with app.test_request_context('/'):
+        catalog.catalog_modified()
+    assert stored[catalog.VERSION_KEY] == lifetime
@@ -0,0 +1,37 @@
+import base64
+import re
+
+import pytest
+
+# A page token that decodes but could not have come from encode_token() is a
+# 400, never a failed query.
+
+
+def token(raw):
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-a-token!',
+    token('{"dt":"xx"}'),
+    token('[[1],1]'),
+    token('[{"dt":"xx"},1]'),
+    token('[{"dt":1},1]'),
+    token('[{"dt":"2024-01-01T00:00:00","x":1},1]'),
+    token('["yesterday",1]'),
+    token('[{"dt":"2024-01-01T00:00:00"},"one"]'),
+    token('[{"dt":"2024-01-01T00:00:00"},true]'),
+    token('[{"dt":"2024-01-01T00:00:00"},%d]' % 2 ** 70),
+    token('[{"dt":"2024-01-01T00:00:00"}]'),
+])
+@pytest.mark.parametrize('direction', ['after', 'before'])
+def test_crafted_token_is_rejected(client, cursor, direction):
+    r = client.get(f'/?{direction}={cursor}')
+    assert r.status_code == 400
+
+
+def test_next_page_link_works(client):
+    r = client.get('/?per_page=5')
+    match = re.search(r'after=([\w-]+)', r.get_data(as_text=True))
+    assert match
+    assert client.get(f'/?per_page=5&after={match.group(1)}').status_code == 200
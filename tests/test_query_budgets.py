@@ -0,0 +1,109 @@
+import pytest
+
+from conftest import ADMIN_PASSWORD, make_app
+from querycount import QueryBudgetExceeded, query_budget
+
+# Every catalog, cart, checkout and admin page is requested with a cold cache
+# and must stay within its @query_budget. The guard raises in tests, so an N+1
+# regression fails here rather than in production.
+
+
+def sql_queries(response):
+    return int(response.headers['X-SQL-Queries'])
+
+
+def budget(app, endpoint):
+    return app.view_functions[endpoint].query_budget
+
+
+def first_product(app):
+    from models import Product
+    with app.app_context():
+        product = Product.query.order_by(Product.id).first()
+        return product.id, product.slug, product.category.slug
+
+
+@pytest.mark.parametrize('endpoint, path', [
+    ('home', '/'),
+    ('home', '/?per_page=24'),
+    ('search', '/search?q=widget'),
+    ('search', '/search?q=widget&sort=price_asc&min_price=150&available=1'),
+])
+def test_catalog_pages(app, client, cold, endpoint, path):
+    cold()
+    r = client.get(path)
+    assert r.status_code == 200
+    assert sql_queries(r) <= budget(app, endpoint)
+
+
+def test_category_and_product_pages(app, client, cold):
+    _, slug, category = first_product(app)
+    for endpoint, path in (
+        ('category_view', f'/category/{category}'),
+        ('category_view', f'/category/{category}?sort=price_desc&max_price=300'),
+        ('product_view', f'/product/{slug}'),
+    ):
+        cold()
+        r = client.get(path)
+        assert r.status_code == 200, path
+        assert sql_queries(r) <= budget(app, endpoint), path
+
+
+def test_cart_and_checkout(app, client, cold):
+    product_id, _, _ = first_product(app)
+    client.post(f'/add-to-cart/{product_id}', data={'qty': '2'})
+    client.post(f'/add-to-cart/{product_id + 1}', data={'qty': '1'})
+    cold()
+    r = client.get('/cart')
+    assert r.status_code == 200
+    assert sql_queries(r) <= budget(app, 'cart')
+    cold()
+    r = client.post('/checkout')
+    assert r.status_code == 303
+    assert sql_queries(r) <= budget(app, 'checkout')
+
+
+def test_checkout_selling_out(app, client, cold):
+    # The last unit also recounts the category facets in the same transaction.
+    from models import db, CategoryFacet, Product
+    with app.app_context():
+        product = Product.query.order_by(Product.id.desc()).first()
+        product.stock = 1
+        db.session.commit()
+        product_id, category_id = product.id, product.category_id
+        available = db.session.get(CategoryFacet, category_id).available
+    client.post(f'/add-to-cart/{product_id}', data={'qty': '1'})
+    cold()
+    r = client.post('/checkout')
+    assert r.status_code == 303
+    assert sql_queries(r) <= budget(app, 'checkout')
+    with app.app_context():
+        assert db.session.get(Product, product_id).stock == 0
+        assert db.session.get(CategoryFacet, category_id).available == available - 1
+
+
+def test_admin_listings(app, client, cold):
+    r = client.post('/admin/login', data={'username': 'admin', 'password': ADMIN_PASSWORD})
+    assert r.status_code == 302
+    for endpoint, path in (
+        ('admin_dashboard', '/admin/dashboard'),
+        ('admin_product_list', '/admin/products'),
+        ('admin_product_list', '/admin/products?q=widget&available=1&min_price=150'),
+    ):
+        cold()
+        r = client.get(path)
+        assert r.status_code == 200, path
+        assert sql_queries(r) <= budget(app, endpoint), path
+
+
+def test_over_budget_view_raises(database_uri):
+    app = make_app(database_uri)
+
+    @app.route('/test/n-plus-one')
+    @query_budget(2)
+    def n_plus_one():
+        from models import Product
+        return ','.join(p.category.name for p in Product.query.limit(5))
+
+    with pytest.raises(QueryBudgetExceeded, match='budget 2'):
+        app.test_client().get('/test/n-plus-one')
@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+# Malformed payment webhooks are rejected with a 400 before anything is
+# recorded; a valid one is stored once however often the provider retries.
+
+
+@pytest.mark.parametrize('payload', [
+    'not json',
+    '[]',
+    '{"type": "checkout.session.completed"}',
+    '{"id": "evt_1"}',
+    '{"id": 42, "type": "checkout.session.completed"}',
+    '{"id": "evt_1", "type": "checkout.session.expired", "data": {"object": "cs_1"}}',
+    '{"id": "evt_1", "type": "checkout.session.expired", "data": {"object": {"id": ["cs_1"]}}}',
+])
+def test_malformed_webhook_is_rejected(client, payload):
+    r = client.post('/webhooks/stripe', data=payload, content_type='application/json')
+    assert r.status_code == 400
+
+
+def test_webhook_is_recorded_once(app, client):
+    from models import PaymentEvent
+    event = {'id': 'evt_test_once', 'type': 'checkout.session.expired', 'data': {'object': {'id': 'cs_test_once'}}}
+    for _ in range(2):
+        r = client.post('/webhooks/stripe', data=json.dumps(event), content_type='application/json')
+        assert r.status_code == 200
+    with app.app_context():
+        assert PaymentEvent.query.filter_by(event_id='evt_test_once').count() == 1
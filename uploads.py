@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import datetime
+
+from flask import Request, current_app, flash, redirect, request
+from sqlalchemy import update
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import catalog
+import images
+from models import db, Product
+from tasks import task_queue
+
+log = logging.getLogger(__name__)
+
+# Admin image uploads. The multipart parser writes each file straight into a
+# temp file in chunks (no in-memory copy), hashing it and enforcing
+# UPLOAD_MAX_BYTES as it goes. store() then moves it to
+# images/products/uploads/<sha256>.<ext>: the same picture uploaded twice, under
+# any name, is one file, and two different files can never overwrite each
+# other. Thumbnails are built on the task queue, not in the request.
+
+UPLOAD_DIR = 'images/products/uploads'
+
+# Leading bytes -> extension. The client's filename and Content-Type are ignored.
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+class UploadError(ValueError):
+    pass
+
+
+# ---------- Receiving ----------
+class HashingFile:
+    # File object handed to werkzeug's form parser for each uploaded file.
+    def __init__(self, directory, limit):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self.file = os.fdopen(fd, 'w+b')
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.limit = limit
+        self.head = b''
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            # The parser drops a file it fails on, so clean up here.
+            self.close()
+            raise RequestEntityTooLarge(f"Uploads are limited to {self.limit // (1024 * 1024)} MB")
+        if len(self.head) < 16:
+            self.head += data[:16 - len(self.head)]
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def close(self):
+        # Closed with the request; a file that store() didn't claim is removed.
+        self.file.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config
+        return HashingFile(config['UPLOAD_TMP_DIR'], config['UPLOAD_MAX_BYTES'])
+
+
+def sniff(head):
+    for signature, ext in SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+# ---------- Storing ----------
+def store(storage):
+    # Takes a FileStorage from request.files and returns the image's static
+    # path. Raises UploadError for anything that isn't a JPEG/PNG/GIF/WebP.
+    received = storage.stream
+    if not isinstance(received, HashingFile) or not received.size:
+        raise UploadError("No image received")
+    ext = sniff(received.head)
+    if ext is None:
+        raise UploadError("Only JPEG, PNG, GIF and WebP images can be uploaded")
+    name = f'{UPLOAD_DIR}/{received.sha256.hexdigest()}.{ext}'
+    target = os.path.join(current_app.static_folder, *name.split('/'))
+    received.file.flush()
+    if os.path.exists(target):
+        log.info("Upload matches existing %s", name)
+    else:
+        os.chmod(received.path, 0o644)
+        # The temp dir sits inside UPLOAD_DIR, so this is an atomic rename.
+        os.replace(received.path, target)
+        received.path = None
+    return name
+
+
+def build_derivatives(static_folder, image):
+    # Pages rendered while the job was queued show the original, and are
+    # cached and ETagged by the products' updated_at. Moving that on once the
+    # thumbnails exist gives the cards, pages and catalog cache new versions.
+    if not images.generate_derivatives(static_folder, image):
+        return
+    changed = db.session.execute(
+        update(Product)
+        .where(Product.image == image)
+        .values(updated_at=datetime.utcnow())
+        .returning(Product.slug, Product.category_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    if changed:
+        catalog.invalidate_product({slug for slug, _ in changed}, {c for _, c in changed})
+
+
+def schedule_derivatives(image):
+    # Thumbnails appear when the job finishes; until then pages show the
+    # original (images.has_derivatives). `python build_images.py` catches up
+    # if the queue was full.
+    if image:
+        task_queue.submit(build_derivatives, current_app.static_folder, image)
+
+
+def init_app(app):
+    app.request_class = UploadRequest
+    app.config.setdefault('UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+    if not app.config.get('UPLOAD_TMP_DIR'):
+        app.config['UPLOAD_TMP_DIR'] = os.path.join(app.static_folder, *UPLOAD_DIR.split('/'), '.incoming')
+    # Whole-request cap, checked against Content-Length before any parsing.
+    if app.config.get('MAX_CONTENT_LENGTH') is None:
+        app.config['MAX_CONTENT_LENGTH'] = app.config['UPLOAD_MAX_BYTES'] + 1024 * 1024
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def upload_too_large(exc):
+        # Send form posts back to their page with a message, not a bare 413.
+        if request.method == 'POST' and request.referrer and not request.is_json:
+            flash(f"Uploads are limited to {app.config['UPLOAD_MAX_BYTES'] // (1024 * 1024)} MB", "danger")
+            return redirect(request.referrer)
+        return exc